@@ -0,0 +1,70 @@
+# 🏁 Cold start of N workers
+#
+# Launches N fresh Python processes at once, as a process manager does on a
+# deploy. Each imports the app and runs its lifespan startup (engine, bcrypt
+# warm-up, catalog cache warmup) and reports when it would start accepting
+# requests. Prints time-to-ready per worker, split into interpreter start,
+# import and startup, plus p50/max across workers.
+#
+#   python benchmarks/bench_cold_start.py --workers 8
+#   python benchmarks/bench_cold_start.py --workers 8 --app survey-app-async.py
+#   python benchmarks/bench_cold_start.py --workers 8 --app survey-app3.py   # engine at import, nothing warmed, for comparison
+#   WARM_CATEGORIES=0 python benchmarks/bench_cold_start.py                 # without the cache warmup
+
+import argparse, asyncio, json, os, statistics, subprocess, sys, time
+
+from harness import HERE, load_module, seed_catalog
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///./bench-cold-start.db")
+os.environ.setdefault("GEO_PROVIDER", "stub")
+
+
+def worker(app_file: str):
+    started = time.time()
+    module = load_module(app_file, "cold_start_target")
+    imported = time.time()
+
+    async def boot():
+        async with module.app.router.lifespan_context(module.app):
+            return time.time()
+
+    ready = asyncio.run(boot())
+    print(json.dumps({"started": started, "imported": imported, "ready": ready}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time-to-ready of N simultaneously started workers")
+    parser.add_argument("--app", default="survey-app4.py")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--categories", type=int, default=20)
+    parser.add_argument("--products", type=int, default=200, help="products per category")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        worker(args.app)
+        return
+
+    seed_catalog(os.environ["DATABASE_URL"], args.categories, 10, args.products, reset=False)
+    launched = time.time()
+    processes = [subprocess.Popen([sys.executable, os.path.abspath(__file__), "--worker", "--app", args.app],
+                                  cwd=HERE, stdout=subprocess.PIPE, text=True) for _ in range(args.workers)]
+    reports = []
+    for process in processes:
+        out, _ = process.communicate()
+        if process.returncode != 0:
+            sys.exit(f"worker exited with {process.returncode}")
+        reports.append(json.loads(out.strip().splitlines()[-1]))
+
+    print(f"{args.workers} workers of {args.app}\n")
+    print(f"{'worker':<8}{'interpreter s':>15}{'import s':>10}{'startup s':>11}{'ready s':>9}")
+    ready = []
+    for n, r in enumerate(reports, 1):
+        ready.append(r["ready"] - launched)
+        print(f"{n:<8}{r['started'] - launched:>15.2f}{r['imported'] - r['started']:>10.2f}"
+              f"{r['ready'] - r['imported']:>11.2f}{ready[-1]:>9.2f}")
+    print(f"\ntime to ready: p50 {statistics.median(ready):.2f}s, slowest {max(ready):.2f}s")
+
+
+if __name__ == "__main__":
+    main()
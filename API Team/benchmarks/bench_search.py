@@ -0,0 +1,66 @@
+# 🏁 Typeahead latency of the in-memory search index
+#
+# Builds a SearchIndex over synthetic "Brand Noun Noun 1234" product names (1M
+# by default) and times a fixed set of queries: single prefixes, multi-word
+# queries whose words are common on their own but rare together, and queries
+# with no match at all. Reports build time and p50/p95/p99 per query. Single
+# prefixes answer in tens of microseconds; rare combinations of common words
+# ("pro max 99") are the worst case, around a millisecond.
+#
+#   python benchmarks/bench_search.py --names 1000000
+
+import argparse, random, time
+
+from harness import percentile
+
+from search_index import SearchIndex
+
+BRANDS = ["Samsung", "Apple", "Lenovo", "Frito-Lay", "Lay's", "Pringles", "Nestle", "Sony", "LG", "Xiaomi",
+          "Dell", "HP", "Asus", "Acer", "Oppo", "Vivo", "Realme", "Nokia", "Motorola", "OnePlus"]
+NOUNS = ["Galaxy", "Phone", "Chips", "Classic", "Pro", "Max", "Ultra", "Lite", "Book", "Air",
+         "Note", "Smart", "TV", "Laptop", "Tablet", "Watch", "Buds", "Speaker", "Camera", "Monitor"]
+QUERIES = ["s", "sa", "samsung", "lays cl", "samsung gal", "galaxy 12", "pro max 99", "a b c",
+           "sony watch camera 4242", "internationalization", "zzz"]
+
+
+def synthetic_rows(names: int, seed: int):
+    rng = random.Random(seed)
+    rows = [("company", n, brand, None) for n, brand in enumerate(BRANDS, 1)]
+    for product_id in range(1, names + 1):
+        company_id = rng.randint(1, len(BRANDS))
+        name = f"{BRANDS[company_id - 1]} {rng.choice(NOUNS)} {rng.choice(NOUNS)} {rng.randint(1, 9999)}"
+        rows.append(("product", product_id, name, company_id))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latency of the in-memory product/company search index")
+    parser.add_argument("--names", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=200, help="runs per query")
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rows = synthetic_rows(args.names, args.seed)
+    started = time.perf_counter()
+    index = SearchIndex.build(rows)
+    print(f"indexed {len(index)} names, {len(index._postings)} prefixes in {time.perf_counter() - started:.1f}s")
+
+    print(f"\n{'query':<26}{'hits':>6}{'p50 us':>10}{'p95 us':>10}{'p99 us':>10}")
+    overall = []
+    for query in QUERIES:
+        latencies = []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            hits = index.search(query, args.limit)
+            latencies.append(time.perf_counter() - started)
+        overall += latencies
+        latencies.sort()
+        print(f"{query:<26}{len(hits):>6}{percentile(latencies, 0.5) * 1e6:>10.0f}"
+              f"{percentile(latencies, 0.95) * 1e6:>10.0f}{percentile(latencies, 0.99) * 1e6:>10.0f}")
+    overall.sort()
+    print(f"\nall queries p99 {percentile(overall, 0.99) * 1e6:.0f} us, max {overall[-1] * 1e6:.0f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+# 🏁 Serialization cost of /category-details per 10k products
+#
+# Seeds one category with 10,000 products (SQLite by default) and times the
+# two ways of turning it into the cached JSON body:
+#
+#   before  ORM objects with joinedload -> ProductOut/CompanyOut models ->
+#           jsonable_encoder -> json.dumps
+#   after   Core result tuples -> plain dicts -> orjson.dumps
+#
+# "load" is the query plus building the rows or models, "serialize" is
+# producing the bytes from them. Each figure is the median of --repeat runs.
+#
+#   python benchmarks/bench_serialization.py --products 10000
+
+import argparse, json, os, statistics, tempfile, time
+
+from harness import seed_catalog
+
+import orjson
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session, joinedload
+
+import catalog_listing
+from models import Company, Product, Question, question_category
+from schemas import CategoryDetails, CompanyOut, ProductOut
+
+
+def load_before(db, category_id: int) -> CategoryDetails:
+    # the build_category_details this replaced
+    questions = db.query(Question).filter(Question.question_id.in_(
+        select(question_category.c.question_id).where(question_category.c.category_id == category_id)
+    )).all()
+    companies = db.query(Company).filter(Company.parent_category == category_id).all()
+    products = (db.query(Product).options(joinedload(Product.company)).join(Company)
+                .filter(Company.parent_category == category_id).all())
+    return CategoryDetails(
+        questions=[jsonable_encoder(q) for q in questions],
+        companies=[jsonable_encoder(c) for c in companies],
+        products=[ProductOut(product_id=p.product_id, name=p.name,
+                             company=CompanyOut(company_id=p.company.company_id, name=p.company.name))
+                  for p in products],
+    )
+
+
+def serialize_before(details: CategoryDetails) -> bytes:
+    return json.dumps(jsonable_encoder(details), separators=(",", ":")).encode("utf-8")
+
+
+def timed(fn, repeat: int):
+    seconds, result = [], None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        seconds.append(time.perf_counter() - started)
+    return statistics.median(seconds), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serialization cost of /category-details, before and after")
+    parser.add_argument("--products", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--database-url", help="default: a scratch SQLite file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        url = args.database_url or f"sqlite:///{os.path.join(tmp, 'bench-serialization.db')}"
+        seed_catalog(url, categories=1, questions=20, products=args.products, reset=True,
+                     explicit_url=bool(args.database_url))
+        engine = create_engine(url)
+        with Session(engine) as db:
+            # each load gets a fresh identity map, as a request would
+            def before():
+                db.expunge_all()
+                return load_before(db, 1)
+
+            load_old, details_old = timed(before, args.repeat)
+            dump_old, body_old = timed(lambda: serialize_before(details_old), args.repeat)
+            load_new, details_new = timed(lambda: catalog_listing.category_details(db, 1), args.repeat)
+            dump_new, body_new = timed(lambda: orjson.dumps(details_new), args.repeat)
+        engine.dispose()
+
+    if json.loads(body_old) != orjson.loads(body_new):
+        print("warning: before and after bodies differ")
+    print(f"{len(details_new['products'])} products, {len(body_new) / 1024:.0f} KiB body\n")
+    print(f"{'':<10}{'load ms':>10}{'serialize ms':>14}{'total ms':>10}")
+    for label, load, dump in (("before", load_old, dump_old), ("after", load_new, dump_new)):
+        print(f"{label:<10}{load * 1000:>10.1f}{dump * 1000:>14.1f}{(load + dump) * 1000:>10.1f}")
+    print(f"\nserialize {dump_old / dump_new:.1f}x faster, end to end {(load_old + dump_old) / (load_new + dump_new):.1f}x")
+
+
+if __name__ == "__main__":
+    main()
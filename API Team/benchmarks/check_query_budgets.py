@@ -0,0 +1,132 @@
+# 🧮 Pins the SQL statement count of every survey-app4 route
+#
+# Seeds catalogs with 1, 100 and 10,000 products per category and drives each
+# route once with QUERY_BUDGET_MODE=raise and the catalog cache off, so every
+# request really hits the DB. A route going over its declared budget fails the
+# request. The per-route high-water marks are then compared against EXPECTED,
+# which pins the counts that must not grow with catalog size. Exits non-zero on
+# any mismatch, so it can gate CI.
+#
+#   python benchmarks/check_query_budgets.py
+
+import asyncio, os, sys, tempfile
+
+from harness import load_module, seed_catalog
+
+os.environ["QUERY_BUDGET_MODE"] = "raise"
+os.environ["CATALOG_CACHE_TTL"] = "0"
+os.environ.setdefault("GEO_PROVIDER", "stub")
+os.environ.setdefault("PASSWORD_HASH_WORKERS", "0")
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+# the snapshot is refreshed explicitly below, not by the background loop
+os.environ["ANALYTICS_SNAPSHOT_MODE"] = "read"
+
+import httpx
+import query_budget
+
+SCALES = (1, 100, 10_000)
+QUESTIONS = 5
+# exact statement counts; anything here growing with the product count is an N+1
+EXPECTED = {
+    "register_user": 3,
+    "login": 2,  # with a rehash, 1 without
+    "get_category_options": 1,
+    "get_category_details": 3,
+    "list_category_products": 1,
+    "list_category_questions": 1,
+    "search_catalog": 0,
+    "submit_responses": 5,
+    "get_category_analytics": 1,
+    "get_question_analytics": 1,
+    "get_question_breakdown": 0,
+    "logout_all": 1,
+}
+
+
+def age_password_hash(email: str, password: str):
+    # stored at another bcrypt cost, as after a BCRYPT_ROUNDS change, so the next login rehashes it
+    from sqlalchemy import create_engine, update
+    from models import User
+    from password_hashing import make_context
+
+    engine = create_engine(os.environ["DATABASE_URL"])
+    try:
+        with engine.begin() as conn:
+            conn.execute(update(User).where(User.email == email)
+                         .values(hashed_password=make_context(int(os.environ["BCRYPT_ROUNDS"]) + 1).hash(password)))
+    finally:
+        engine.dispose()
+
+
+async def exercise(app, snapshots) -> list:
+    failures = []
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(transport=transport, base_url="http://check") as client:
+        async def call(method, url, **kwargs):
+            res = await client.request(method, url, **kwargs)
+            if res.status_code >= 400:
+                failures.append(f"{method} {url} -> {res.status_code}: {res.text[:300]}")
+            return res
+
+        form = {"full_name": "Budget Check", "email": "budget@example.com", "password": "budget-pass",
+                "gender": "other", "age": "26-30"}
+        await call("POST", "/register", data=form)
+        credentials = {"email": form["email"], "password": form["password"]}
+        await asyncio.to_thread(age_password_hash, form["email"], form["password"])
+        await call("POST", "/token", data=credentials)
+        token = (await call("POST", "/token", data=credentials)).json()
+        headers = {"Authorization": f"Bearer {token['access_token']}"}
+        await call("GET", "/category-options", headers=headers)
+        details = (await call("GET", "/category-details/1", headers=headers)).json()
+        page = (await call("GET", "/category-details/1/products", headers=headers, params={"limit": 50})).json()
+        if page["next_cursor"] is not None:
+            await call("GET", "/category-details/1/products", headers=headers,
+                       params={"limit": 50, "after": page["next_cursor"]})
+        await call("GET", "/category-details/1/questions", headers=headers)
+        await call("GET", "/search", headers=headers, params={"q": "prod"})
+        answers = [{"question_id": q["question_id"], "category_id": 1, "product_id": p["product_id"],
+                    "answer_text": "yes"} for q in details["questions"] for p in details["products"][:2]]
+        await call("POST", "/submit-responses", json=answers, headers=headers)
+        await call("GET", "/analytics/categories/1", headers=headers)
+        await call("GET", f"/analytics/categories/1/questions/{details['questions'][0]['question_id']}",
+                   headers=headers, params={"group_by": "age"})
+        await asyncio.to_thread(snapshots.refresh)
+        await call("GET", f"/analytics/categories/1/questions/{details['questions'][0]['question_id']}/breakdown",
+                   headers=headers,
+                   params={"group_by": ["age", "gender"], "product_id": details["products"][0]["product_id"]})
+        await call("POST", "/logout-all", headers=headers)
+    return failures
+
+
+async def main() -> int:
+    problems = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for products in SCALES:
+            url = f"sqlite:///{os.path.join(tmp, f'bench-budget-{products}.db')}"
+            os.environ["DATABASE_URL"] = url
+            os.environ["ANALYTICS_SNAPSHOT_DIR"] = os.path.join(tmp, f"snapshot-{products}")
+            seed_catalog(url, categories=2, questions=QUESTIONS, products=products, reset=True)
+            query_budget.reset_high_water()
+            module = load_module("survey-app4.py", f"survey_app4_budget_{products}")
+            async with module.app.router.lifespan_context(module.app):
+                failures = await exercise(module.app, module.response_snapshots)
+
+            observed = dict(query_budget.high_water)
+            print(f"\n{products} products per category")
+            for name in sorted(observed):
+                expected = EXPECTED.get(name)
+                mark = "" if expected is None or observed[name] == expected else f"  expected {expected}"
+                print(f"  {name:<26}{observed[name]:>4}{mark}")
+                if mark:
+                    problems.append(f"{products} products: {name} issued {observed[name]}, expected {expected}")
+            problems += [f"{products} products: {f}" for f in failures]
+
+    if problems:
+        print("\nFAILED\n" + "\n".join(problems))
+        return 1
+    print("\nall query counts as pinned")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
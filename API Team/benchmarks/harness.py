@@ -0,0 +1,122 @@
+# Shared plumbing for the in-process benchmarks: load an app module by file
+# name (the app files have hyphens, so they can't be imported normally), seed
+# a synthetic catalog and summarize latencies.
+#
+# The schema comes from the migrations (migrate.py), like a deployed database.
+# A reset drops every table first. It is refused unless the database was named
+# on the command line or has "bench" in its name, so a DATABASE_URL left in
+# the shell never gets wiped by accident.
+
+import asyncio, importlib.util, os, statistics, sys, time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.dirname(HERE)
+if APP_DIR not in sys.path:
+    sys.path.insert(0, APP_DIR)
+
+
+def load_module(filename: str, name: str):
+    spec = importlib.util.spec_from_file_location(name, os.path.join(APP_DIR, filename))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def load_app(filename: str, name: str):
+    return load_module(filename, name).app
+
+
+def percentile(sorted_values, fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, max(0, round(len(sorted_values) * fraction) - 1))]
+
+
+def summarize(latencies, elapsed: float) -> dict:
+    latencies = sorted(latencies)
+    return {
+        "requests": len(latencies),
+        "rps": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": statistics.median(latencies) * 1000 if latencies else 0.0,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "max_ms": latencies[-1] * 1000 if latencies else 0.0,
+    }
+
+
+async def run_concurrently(calls, concurrency: int):
+    # calls: zero-argument coroutine functions; returns (latencies, results, elapsed)
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(call):
+        async with semaphore:
+            started = time.perf_counter()
+            result = await call()
+            latencies.append(time.perf_counter() - started)
+            return result
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*[one(call) for call in calls])
+    return latencies, results, time.perf_counter() - started
+
+
+def scratch_database(url: str) -> bool:
+    # sqlite:///./bench-e2e.db, postgresql://.../surveybench
+    from sqlalchemy.engine import make_url
+
+    return "bench" in os.path.basename(make_url(url).database or "").lower()
+
+
+def build_schema(url: str, reset: bool = False, explicit_url: bool = False):
+    from sqlalchemy import MetaData, create_engine
+    from sqlalchemy.engine import make_url
+    import migrate
+
+    if reset:
+        if not (explicit_url or scratch_database(url)):
+            raise SystemExit(f"refusing to reset {make_url(url).render_as_string(hide_password=True)}: "
+                             f"pass it with --database-url or use a database with 'bench' in its name")
+        engine = create_engine(url)
+        try:
+            # alembic_version included, the migrations start over from an empty database
+            tables = MetaData()
+            tables.reflect(engine)
+            tables.drop_all(engine)
+        finally:
+            engine.dispose()
+    if migrate.main(["--database-url", url]) != 0:
+        raise SystemExit("migrations failed")
+
+
+def seed_catalog(url: str, categories: int, questions: int, products: int, reset: bool = False,
+                 explicit_url: bool = False):
+    # questions and products are per category; companies get 10 products each
+    from sqlalchemy import create_engine
+    from models import Category, Question, question_category, Company, Product
+    import category_tree
+
+    build_schema(url, reset, explicit_url)
+    engine = create_engine(url)
+    companies_per_category = max(1, products // 10)
+    with engine.begin() as conn:
+        if conn.execute(Category.__table__.select().limit(1)).first():
+            return
+        conn.execute(Category.__table__.insert(), [
+            {"category_id": c, "name": f"Category {c}", "is_active": True} for c in range(1, categories + 1)])
+        conn.execute(Question.__table__.insert(), [
+            {"question_id": q, "question_description": f"Synthetic question {q}", "question_code": f"Q{q:05d}"}
+            for q in range(1, categories * questions + 1)])
+        conn.execute(question_category.insert(), [
+            {"question_id": (c - 1) * questions + q, "category_id": c}
+            for c in range(1, categories + 1) for q in range(1, questions + 1)])
+        conn.execute(Company.__table__.insert(), [
+            {"company_id": (c - 1) * companies_per_category + n, "name": f"Company {c}-{n}",
+             "sector": f"Category {c}", "parent_category": c}
+            for c in range(1, categories + 1) for n in range(1, companies_per_category + 1)])
+        conn.execute(Product.__table__.insert(), [
+            {"product_id": (c - 1) * products + p, "name": f"Product {c}-{p}",
+             "company_id": (c - 1) * companies_per_category + 1 + (p - 1) % companies_per_category}
+            for c in range(1, categories + 1) for p in range(1, products + 1)])
+        category_tree.rebuild_closure(conn)
+    engine.dispose()
@@ -0,0 +1,131 @@
+# 📦 Category catalog cache
+#
+# /category-details payloads hardly ever change, so the serialized JSON bytes
+# are kept per category_id together with an ETag. Every entry remembers the
+# catalog version it was built under; bump() moves the version on and all
+# entries built before it stop being served. The TTL bounds how long another
+# worker process can keep serving a payload after this one changed the catalog.
+#
+# Writers outside the app (catalog_import.py) go around the ORM hooks that
+# call bump(). They bump catalog_state.version instead, and CatalogWatcher
+# polls that row every CATALOG_POLL_INTERVAL seconds in each worker and hands
+# a change to the app, which bumps its caches and rebuilds its search index.
+
+import asyncio, hashlib, logging, threading, time
+from datetime import datetime, UTC
+from typing import Awaitable, Callable, Dict, Hashable, NamedTuple, Optional
+
+from sqlalchemy import insert, select, update
+
+from models import CatalogState
+
+log = logging.getLogger(__name__)
+
+STATE_ID = 1
+
+
+class CachedPayload(NamedTuple):
+    body: bytes
+    etag: str
+    version: int
+    expires_at: float
+
+
+def make_etag(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
+class CatalogCache:
+    def __init__(self, ttl: float = 300, max_entries: int = 1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.version = 0
+        self._entries: Dict[Hashable, CachedPayload] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[CachedPayload]:
+        entry = self._entries.get(key)
+        if entry is None or entry.version != self.version or entry.expires_at < time.monotonic():
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry
+
+    def put(self, key: Hashable, body: bytes, version: int) -> CachedPayload:
+        # version is read before the payload is built, so a bump during the build is never masked
+        entry = CachedPayload(body, make_etag(body), version, time.monotonic() + self.ttl)
+        with self._lock:
+            if version == self.version:
+                if len(self._entries) >= self.max_entries and key not in self._entries:
+                    self._entries.pop(next(iter(self._entries)))
+                self._entries[key] = entry
+        return entry
+
+    def bump(self):
+        with self._lock:
+            self.version += 1
+            self._entries.clear()
+
+
+# ------------------ Cross-process version ------------------ #
+def shared_version_query():
+    return select(CatalogState.version).where(CatalogState.state_id == STATE_ID)
+
+
+def bump_shared_version(conn):
+    # runs in the writer's transaction, workers see the new version together with the rows
+    now = datetime.now(UTC)
+    bumped = conn.execute(update(CatalogState).where(CatalogState.state_id == STATE_ID)
+                          .values(version=CatalogState.version + 1, changed_at=now))
+    if not bumped.rowcount:
+        conn.execute(insert(CatalogState).values(state_id=STATE_ID, version=1, changed_at=now))
+
+
+class CatalogWatcher:
+    def __init__(self, read_version: Callable[[], Awaitable[Optional[int]]],
+                 on_change: Callable[[], Awaitable[None]], interval: float = 30):
+        self.read_version = read_version
+        self.on_change = on_change
+        self.interval = interval
+        self.version: Optional[int] = None
+        self.changes = 0
+        self._task: Optional[asyncio.Task] = None
+
+    async def poll(self) -> bool:
+        version = await self.read_version() or 0
+        # the first read only sets the baseline, the caches were just built
+        changed = self.version is not None and version != self.version
+        self.version = version
+        if changed:
+            self.changes += 1
+            await self.on_change()
+        return changed
+
+    async def _run(self):
+        while True:
+            try:
+                await self.poll()
+            except Exception:
+                log.exception("catalog version poll failed, retrying in %ss", self.interval)
+            await asyncio.sleep(self.interval)
+
+    async def start(self):
+        if self.interval > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
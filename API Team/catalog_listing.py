@@ -0,0 +1,96 @@
+# 📜 Keyset-paginated and streamed catalog listings
+#
+# Large categories are listed a page at a time, ordered by primary key and
+# continued with `WHERE id > :after`. A page costs the same at any depth,
+# unlike OFFSET. The NDJSON mode walks the whole listing through a
+# server-side cursor (yield_per), so the worker holds one batch in memory
+# however big the category is.
+
+from typing import Callable, Iterator, Optional, Tuple
+
+import orjson
+from sqlalchemy import select
+
+import category_tree
+from models import Company, Product, Question, question_category
+
+STREAM_BATCH = 1000
+
+
+def category_scope(category_id: int, include_descendants: bool):
+    return category_tree.descendants_of(category_id) if include_descendants else [category_id]
+
+
+def product_listing(category_id: int, include_descendants: bool = False):
+    return (
+        select(Product.product_id, Product.name,
+               Company.company_id, Company.name.label("company_name"))
+        .join(Company, Product.company_id == Company.company_id)
+        .where(Company.parent_category.in_(category_scope(category_id, include_descendants)))
+        .order_by(Product.product_id)
+    )
+
+
+def company_listing(category_id: int, include_descendants: bool = False):
+    return (
+        select(Company.company_id, Company.name)
+        .where(Company.parent_category.in_(category_scope(category_id, include_descendants)))
+        .order_by(Company.company_id)
+    )
+
+
+def question_listing(category_id: int, include_descendants: bool = False):
+    linked = select(question_category.c.question_id).where(
+        question_category.c.category_id.in_(category_scope(category_id, include_descendants)))
+    return (
+        select(Question.question_id, Question.question_description)
+        .where(Question.question_id.in_(linked))
+        .order_by(Question.question_id)
+    )
+
+
+def product_item(row) -> dict:
+    return {"product_id": row.product_id, "name": row.name,
+            "company": {"company_id": row.company_id, "name": row.company_name}}
+
+
+def company_item(row) -> dict:
+    return {"company_id": row.company_id, "name": row.name}
+
+
+def question_item(row) -> dict:
+    return {"question_id": row.question_id, "question_description": row.question_description}
+
+
+def category_details(db, category_id: int, include_descendants: bool = False) -> dict:
+    # the CategoryDetails shape built straight from result tuples: no ORM objects, no model validation
+    return {
+        "questions": [question_item(row) for row in db.execute(question_listing(category_id, include_descendants))],
+        "companies": [company_item(row) for row in db.execute(company_listing(category_id, include_descendants))],
+        "products": [product_item(row) for row in db.execute(product_listing(category_id, include_descendants))],
+    }
+
+
+def keyset_page(db, stmt, key_column, after: Optional[int], limit: int,
+                to_item: Callable) -> Tuple[list, Optional[int]]:
+    if after is not None:
+        stmt = stmt.where(key_column > after)
+    # one extra row tells whether there is a next page without a COUNT
+    rows = db.execute(stmt.limit(limit + 1)).all()
+    items = [to_item(row) for row in rows[:limit]]
+    next_cursor = getattr(rows[limit - 1], key_column.key) if len(rows) > limit else None
+    return items, next_cursor
+
+
+def stream_ndjson(session_factory, stmt, key_column, after: Optional[int], to_item: Callable,
+                  batch_size: int = STREAM_BATCH) -> Iterator[bytes]:
+    # owns its session: the response body is produced after the request's dependencies are closed
+    if after is not None:
+        stmt = stmt.where(key_column > after)
+    db = session_factory()
+    try:
+        result = db.execute(stmt.execution_options(yield_per=batch_size))
+        for rows in result.partitions():
+            yield b"".join(orjson.dumps(to_item(row)) + b"\n" for row in rows)
+    finally:
+        db.close()
@@ -0,0 +1,60 @@
+# 🌳 Category hierarchy
+#
+# Category.parent_id makes the catalog a tree. category_closure holds every
+# (ancestor, descendant, depth) pair, so "this category and everything under
+# it" is one indexed lookup instead of a recursive walk. The closure is
+# rebuilt whenever categories change; one recursive INSERT...SELECT is cheap at
+# catalog sizes. The nested tree for dropdowns is assembled in Python from a
+# single flat query.
+
+from typing import Dict, List
+
+from sqlalchemy import delete, select, text
+from sqlalchemy.orm import Session
+
+from models import Category, CategoryClosure
+
+MAX_DEPTH = 32  # also stops a parent_id cycle from recursing forever
+
+REBUILD_SQL = text(f"""
+    WITH RECURSIVE tree(ancestor_id, descendant_id, depth) AS (
+        SELECT category_id, category_id, 0 FROM category
+        UNION ALL
+        SELECT tree.ancestor_id, category.category_id, tree.depth + 1
+        FROM tree JOIN category ON category.parent_id = tree.descendant_id
+        WHERE tree.depth < {MAX_DEPTH}
+    )
+    INSERT INTO category_closure (ancestor_id, descendant_id, depth)
+    SELECT ancestor_id, descendant_id, depth FROM tree
+""")
+
+
+def rebuild_closure(db):
+    # db is a Session or a Connection; runs inside the caller's transaction
+    db.execute(delete(CategoryClosure))
+    db.execute(REBUILD_SQL)
+
+
+def descendants_of(category_id: int):
+    # subquery for .in_(): the category itself and every category below it
+    return select(CategoryClosure.descendant_id).where(CategoryClosure.ancestor_id == category_id)
+
+
+def build_tree(rows) -> List[dict]:
+    # rows of (category_id, name, parent_id); a category whose parent isn't among them becomes a root
+    nodes: Dict[int, dict] = {row.category_id: {"label": row.name, "value": row.category_id, "children": []}
+                              for row in rows}
+    roots = []
+    for row in rows:
+        parent = nodes.get(row.parent_id)
+        (parent["children"] if parent is not None else roots).append(nodes[row.category_id])
+    return roots
+
+
+def active_tree(db: Session) -> List[dict]:
+    rows = db.execute(
+        select(Category.category_id, Category.name, Category.parent_id)
+        .where(Category.is_active == True)
+        .order_by(Category.name)
+    ).all()
+    return build_tree(rows)
@@ -0,0 +1,175 @@
+# 🔌 Engine factory and connection-pool telemetry
+#
+# Pool sizing comes from the environment (DB_POOL_SIZE, DB_MAX_OVERFLOW,
+# DB_POOL_TIMEOUT, DB_POOL_PRE_PING, DB_POOL_RECYCLE) so it can be tuned per
+# deployment without code changes. The pool class records how long each
+# checkout waited, which together with the live checked-out/overflow numbers is
+# what we need to size the pool under load.
+
+import os, threading, time
+from bisect import bisect_left
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
+
+WAIT_BUCKETS_MS = (0.1, 0.5, 1, 5, 10, 25, 50, 100, 250, 500, 1000, 5000)
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.lower() in ("1", "true", "yes", "on")
+
+
+def pool_options_from_env() -> dict:
+    return {
+        "pool_size": int(os.getenv("DB_POOL_SIZE", "5")),
+        "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "10")),
+        "pool_timeout": float(os.getenv("DB_POOL_TIMEOUT", "30")),
+        "pool_pre_ping": _env_bool("DB_POOL_PRE_PING", True),
+        "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", "1800")),
+    }
+
+
+class PoolTelemetry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.wait_counts = [0] * (len(WAIT_BUCKETS_MS) + 1)
+        self.wait_sum_ms = 0.0
+        self.wait_max_ms = 0.0
+        self.checkouts = 0
+        self.timeouts = 0
+        self.connects = 0
+        self.invalidations = 0
+        self.pool = None
+
+    def record_wait(self, seconds: float, timed_out: bool = False):
+        ms = seconds * 1000
+        with self._lock:
+            self.wait_counts[bisect_left(WAIT_BUCKETS_MS, ms)] += 1
+            self.wait_sum_ms += ms
+            self.wait_max_ms = max(self.wait_max_ms, ms)
+            if timed_out:
+                self.timeouts += 1
+
+    def attach(self, pool):
+        self.pool = pool
+        event.listen(pool, "checkout", self._on_checkout)
+        event.listen(pool, "connect", self._on_connect)
+        event.listen(pool, "invalidate", self._on_invalidate)
+
+    def _on_checkout(self, dbapi_conn, record, proxy):
+        self.checkouts += 1
+
+    def _on_connect(self, dbapi_conn, record):
+        self.connects += 1
+
+    def _on_invalidate(self, dbapi_conn, record, exc):
+        self.invalidations += 1
+
+    def snapshot(self) -> dict:
+        pool = self.pool
+        live = {}
+        if isinstance(pool, QueuePool):
+            live = {
+                "size": pool.size(),
+                "checked_in": pool.checkedin(),
+                "checked_out": pool.checkedout(),
+                "overflow": max(pool.overflow(), 0),
+                "max_overflow": pool._max_overflow,
+            }
+        waits = sum(self.wait_counts)
+        return {
+            "pool": type(pool).__name__ if pool is not None else None,
+            **live,
+            "checkouts": self.checkouts,
+            "connects": self.connects,
+            "invalidations": self.invalidations,
+            "timeouts": self.timeouts,
+            "wait_ms": {
+                "buckets": {f"le_{b}": c for b, c in zip(WAIT_BUCKETS_MS + ("inf",), self.wait_counts)},
+                "count": waits,
+                "sum": round(self.wait_sum_ms, 3),
+                "max": round(self.wait_max_ms, 3),
+                "avg": round(self.wait_sum_ms / waits, 3) if waits else 0.0,
+            },
+        }
+
+
+def _timed_pool(base):
+    class TimedPool(base):
+        # _do_get is where a checkout blocks when the pool is exhausted
+        telemetry: PoolTelemetry = None
+
+        def _do_get(self):
+            started = time.perf_counter()
+            try:
+                conn = super()._do_get()
+            except PoolTimeoutError:
+                self.telemetry.record_wait(time.perf_counter() - started, timed_out=True)
+                raise
+            self.telemetry.record_wait(time.perf_counter() - started)
+            return conn
+
+        def recreate(self):
+            # pool events are carried over by recreate(), only the references need moving
+            pool = super().recreate()
+            pool.telemetry = self.telemetry
+            self.telemetry.pool = pool
+            return pool
+
+    TimedPool.__name__ = f"Timed{base.__name__}"
+    return TimedPool
+
+
+TimedQueuePool = _timed_pool(QueuePool)
+TimedAsyncQueuePool = _timed_pool(AsyncAdaptedQueuePool)
+
+
+def _uses_singleton_pool(url: str) -> bool:
+    # in-memory SQLite lives inside one connection, pool sizing doesn't apply
+    return url.startswith("sqlite") and (":memory:" in url or url.rstrip("/").endswith("sqlite:"))
+
+
+def _install_telemetry(engine, telemetry: PoolTelemetry):
+    engine.pool.telemetry = telemetry
+    telemetry.attach(engine.pool)
+
+
+def dialect_insert(dialect_name: str):
+    # INSERT construct with on_conflict_do_update/do_nothing, None where the dialect has no upsert
+    if dialect_name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect_name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        return None
+    return insert
+
+
+def make_engine(url: str, telemetry: PoolTelemetry = None, **overrides):
+    telemetry = telemetry or PoolTelemetry()
+    if _uses_singleton_pool(url):
+        engine = create_engine(url, **overrides)
+        telemetry.attach(engine.pool)
+    else:
+        options = {**pool_options_from_env(), **overrides}
+        engine = create_engine(url, poolclass=TimedQueuePool, **options)
+        _install_telemetry(engine, telemetry)
+    return engine
+
+
+def make_async_engine(url: str, telemetry: PoolTelemetry = None, **overrides):
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    telemetry = telemetry or PoolTelemetry()
+    if _uses_singleton_pool(url):
+        engine = create_async_engine(url, **overrides)
+        telemetry.attach(engine.sync_engine.pool)
+    else:
+        options = {**pool_options_from_env(), **overrides}
+        engine = create_async_engine(url, poolclass=TimedAsyncQueuePool, **options)
+        _install_telemetry(engine.sync_engine, telemetry)
+    return engine
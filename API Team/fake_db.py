@@ -1,2 +1,175 @@
 #i need this file for my userCreation.py to work
-fake_user_db = []
+#
+# 🗂️ In-memory user store for the lightweight signup service
+#
+# Users are kept as __slots__ records (no per-user dict) in one list, with
+# hash indexes on (name, pincode), email and mobile_number, so a lookup is a
+# dict get however many users there are. (name, pincode) is the duplicate
+# check, as it always was. Inserts take a lock around it, so two concurrent
+# signups can't both claim it; reads don't lock. Email and mobile number are
+# lookups only and may be shared: their entry is the record, or a tuple of
+# records once a second user has the same value.
+#
+# snapshot(path) writes every record to disk (written to a temp file, then
+# renamed into place) and UserStore.load(path) reads it back, so the service
+# can restart with millions of users without replaying signups.
+
+import logging, os, pickle, sys, threading
+from typing import Dict, List, Optional, Tuple, Union
+
+log = logging.getLogger(__name__)
+
+SNAPSHOT_VERSION = 1
+
+
+class DuplicateUser(ValueError):
+    def __init__(self, field: str):
+        self.field = field
+        super().__init__(f"a user with this {field} already exists")
+
+
+class UserRecord:
+    __slots__ = ("name", "email", "age_range", "pincode", "gender", "employment_status", "mobile_number")
+
+    def __init__(self, name: str, email: str, age_range: str, pincode: int, gender: str,
+                 employment_status: str, mobile_number: int):
+        self.name = name
+        self.email = email
+        # a handful of distinct values across millions of users, one shared string each
+        self.age_range = sys.intern(age_range)
+        self.pincode = pincode
+        self.gender = sys.intern(gender)
+        self.employment_status = sys.intern(employment_status)
+        self.mobile_number = mobile_number
+
+    def to_dict(self) -> dict:
+        return {field: getattr(self, field) for field in self.__slots__}
+
+    def row(self) -> tuple:
+        return tuple(getattr(self, field) for field in self.__slots__)
+
+
+Matches = Union[UserRecord, Tuple[UserRecord, ...]]
+
+
+def _index(index: dict, key, record: UserRecord):
+    # one dict entry per key either way; the tuple only exists for the rare shared value
+    existing = index.get(key)
+    if existing is None:
+        index[key] = record
+    elif isinstance(existing, UserRecord):
+        index[key] = (existing, record)
+    else:
+        index[key] = existing + (record,)
+
+
+def _matches(entry: Optional[Matches]) -> List[UserRecord]:
+    if entry is None:
+        return []
+    return [entry] if isinstance(entry, UserRecord) else list(entry)
+
+
+class UserStore:
+    def __init__(self):
+        self._records: List[UserRecord] = []
+        self._by_name_pincode: Dict[Tuple[str, int], UserRecord] = {}
+        self._by_email: Dict[str, Matches] = {}
+        self._by_mobile: Dict[int, Matches] = {}
+        self._lock = threading.Lock()
+        self.dirty = False
+
+    def __len__(self):
+        return len(self._records)
+
+    def insert(self, **fields) -> UserRecord:
+        record = UserRecord(**fields)
+        email = record.email.strip().casefold()
+        with self._lock:
+            if (record.name, record.pincode) in self._by_name_pincode:
+                raise DuplicateUser("name and pincode")
+            self._add(record, email)
+            self.dirty = True
+        return record
+
+    def _add(self, record: UserRecord, email: str):
+        self._records.append(record)
+        self._by_name_pincode[(record.name, record.pincode)] = record
+        _index(self._by_email, email, record)
+        _index(self._by_mobile, record.mobile_number, record)
+
+    def find(self, name: str, pincode: int) -> Optional[UserRecord]:
+        return self._by_name_pincode.get((name, pincode))
+
+    def find_by_email(self, email: str) -> List[UserRecord]:
+        return _matches(self._by_email.get(email.strip().casefold()))
+
+    def find_by_mobile(self, mobile_number: int) -> List[UserRecord]:
+        return _matches(self._by_mobile.get(mobile_number))
+
+    # ------------------ Snapshots ------------------ #
+    def snapshot(self, path: str):
+        with self._lock:
+            # records never change after insert, a copy of the list is a consistent view
+            records = list(self._records)
+            self.dirty = False
+        rows = [record.row() for record in records]
+        tmp = f"{path}.tmp"
+        try:
+            with open(tmp, "wb") as f:
+                pickle.dump((SNAPSHOT_VERSION, UserRecord.__slots__, rows), f, protocol=pickle.HIGHEST_PROTOCOL)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, path)
+        except OSError:
+            self.dirty = True
+            raise
+
+    @classmethod
+    def load(cls, path: str) -> "UserStore":
+        # only ever point this at snapshots this service wrote, pickle runs whatever is in the file
+        store = cls()
+        if not os.path.exists(path):
+            return store
+        with open(path, "rb") as f:
+            version, fields, rows = pickle.load(f)
+        if version != SNAPSHOT_VERSION or tuple(fields) != UserRecord.__slots__:
+            raise ValueError(f"{path} is not a version {SNAPSHOT_VERSION} user snapshot")
+        for row in rows:
+            record = UserRecord(*row)
+            store._add(record, record.email.strip().casefold())
+        return store
+
+
+class SnapshotWriter:
+    # rewrites the snapshot every `interval` seconds when something was inserted since the last one
+    def __init__(self, store: UserStore, path: str, interval: float = 60):
+        self.store = store
+        self.path = path
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="user-snapshots", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            if self.store.dirty:
+                try:
+                    self.store.snapshot(self.path)
+                except OSError:
+                    # the store stays dirty, so the next interval writes it again
+                    log.exception("user snapshot to %s failed, retrying in %ss", self.path, self.interval)
+
+    def stop(self):
+        # a final snapshot on the way out, nothing inserted since the last interval is lost
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        if self.store.dirty:
+            self.store.snapshot(self.path)
+
+
+USER_SNAPSHOT_PATH = os.getenv("USER_SNAPSHOT_PATH")  # unset: users live only as long as the process
+fake_user_db = UserStore.load(USER_SNAPSHOT_PATH) if USER_SNAPSHOT_PATH else UserStore()
@@ -0,0 +1,254 @@
+# 🌍 IP geolocation for the survey apps
+#
+# Providers are async and share one pooled httpx client, lookups go through an
+# LRU+TTL cache keyed by the IP's network prefix, and concurrent lookups for the
+# same prefix are coalesced into a single provider call.
+
+import asyncio, ipaddress, os, threading, time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+import httpx
+
+from ip_ranges import IpRangeDB, format_location
+
+UNKNOWN_LOCATION = "Unknown"
+
+
+# ------------------ Providers ------------------ #
+class GeoProvider:
+    name = "base"
+    # offline providers answer synchronously from local data and skip the cache
+    offline = False
+
+    async def lookup(self, ip: str) -> Optional[str]:
+        raise NotImplementedError
+
+    def lookup_sync(self, ip: str) -> Optional[str]:
+        raise NotImplementedError
+
+    async def aclose(self):
+        pass
+
+
+class HTTPGeoProvider(GeoProvider):
+    # one keep-alive pool per provider instead of a new TCP+TLS handshake per signup
+    def __init__(self, timeout: float = 2.0, max_connections: int = 20):
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self._client: Optional[httpx.AsyncClient] = None
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=self.max_connections,
+                                    max_keepalive_connections=self.max_connections),
+            )
+        return self._client
+
+    async def _get_json(self, url: str) -> Optional[dict]:
+        res = await self._get_client().get(url)
+        if res.status_code == 200:
+            return res.json()
+        return None
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+class IpinfoProvider(HTTPGeoProvider):
+    name = "ipinfo"
+
+    def __init__(self, token: str, **kwargs):
+        super().__init__(**kwargs)
+        self.token = token
+
+    async def lookup(self, ip: str) -> Optional[str]:
+        data = await self._get_json(f"https://ipinfo.io/{ip}?token={self.token}")
+        if not data:
+            return None
+        return format_location(data.get("city"), data.get("region"), data.get("country"))
+
+
+class IpapiProvider(HTTPGeoProvider):
+    name = "ipapi"
+
+    def __init__(self, access_key: str, **kwargs):
+        super().__init__(**kwargs)
+        self.access_key = access_key
+
+    async def lookup(self, ip: str) -> Optional[str]:
+        data = await self._get_json(f"http://api.ipapi.com/api/{ip}?access_key={self.access_key}")
+        if not data:
+            return None
+        return format_location(data.get("city"), data.get("region"), data.get("country_name"))
+
+
+class StubProvider(GeoProvider):
+    # offline provider for local runs and tests, never touches the network
+    name = "stub"
+
+    def __init__(self, locations: Dict[str, str] = None, default: str = "Pune, Maharashtra, IN"):
+        self.locations = locations or {}
+        self.default = default
+        self.calls = 0
+
+    async def lookup(self, ip: str) -> Optional[str]:
+        self.calls += 1
+        return self.locations.get(ip, self.default)
+
+
+class LocalRangeProvider(GeoProvider):
+    # embedded lookup against the memory-mapped range table built by ip_ranges.py
+    name = "local"
+    offline = True
+
+    def __init__(self, path: str):
+        self.db = IpRangeDB.open(path)
+
+    def lookup_sync(self, ip: str) -> Optional[str]:
+        return self.db.lookup(ip)
+
+    async def lookup(self, ip: str) -> Optional[str]:
+        return self.db.lookup(ip)
+
+    async def aclose(self):
+        self.db.close()
+
+
+# ------------------ Cache ------------------ #
+class GeoCache:
+    def __init__(self, max_size: int = 10000, ttl: float = 24 * 3600, negative_ttl: float = 300):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: str, value: str):
+        # failed lookups are cached briefly so an outage doesn't turn into a retry storm
+        ttl = self.negative_ttl if value == UNKNOWN_LOCATION else self.ttl
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+def cache_key(ip: str, prefix_v4: int = 24, prefix_v6: int = 48) -> Optional[str]:
+    try:
+        addr = ipaddress.ip_address(ip.strip())
+    except ValueError:
+        return None
+    prefix = prefix_v4 if addr.version == 4 else prefix_v6
+    return str(ipaddress.ip_network(f"{addr}/{prefix}", strict=False))
+
+
+def is_public_ip(ip: str) -> bool:
+    try:
+        return ipaddress.ip_address(ip.strip()).is_global
+    except ValueError:
+        return False
+
+
+# ------------------ Geolocator ------------------ #
+class Geolocator:
+    def __init__(self, provider: GeoProvider, cache: GeoCache = None,
+                 prefix_v4: int = 24, prefix_v6: int = 48):
+        self.provider = provider
+        self.cache = cache if cache is not None else GeoCache()
+        self.prefix_v4 = prefix_v4
+        self.prefix_v6 = prefix_v6
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    def locate_nowait(self, ip: str) -> Optional[str]:
+        # answers from the cache or an offline provider, None means a remote lookup is needed
+        if not ip or not is_public_ip(ip):
+            return UNKNOWN_LOCATION
+        if self.provider.offline:
+            return self.provider.lookup_sync(ip) or UNKNOWN_LOCATION
+        return self.cache.get(cache_key(ip, self.prefix_v4, self.prefix_v6))
+
+    async def locate(self, ip: str) -> str:
+        location = self.locate_nowait(ip)
+        if location is not None:
+            return location
+
+        key = cache_key(ip, self.prefix_v4, self.prefix_v6)
+        # several signups from the same network share one provider round-trip
+        pending = self._inflight.get(key)
+        if pending is not None:
+            return await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            try:
+                location = await self.provider.lookup(ip)
+            except Exception:
+                location = None
+            location = location or UNKNOWN_LOCATION
+            self.cache.set(key, location)
+            future.set_result(location)
+            return location
+        finally:
+            if not future.done():
+                future.set_result(UNKNOWN_LOCATION)
+            self._inflight.pop(key, None)
+
+    async def aclose(self):
+        await self.provider.aclose()
+
+
+def provider_from_env() -> GeoProvider:
+    name = os.getenv("GEO_PROVIDER", "ipinfo")
+    timeout = float(os.getenv("GEO_TIMEOUT", "2.0"))
+    if name == "ipinfo":
+        return IpinfoProvider(os.getenv("IPINFO_TOKEN", "162351233b46c0"), timeout=timeout)
+    if name == "ipapi":
+        return IpapiProvider(os.getenv("IPAPI_ACCESS_KEY", "6a27abcf72b32752edf84354e82ed1d0"), timeout=timeout)
+    if name == "stub":
+        return StubProvider()
+    if name == "local":
+        return LocalRangeProvider(os.getenv("GEO_DB_PATH", "ip_ranges.ipdb"))
+    raise ValueError(f"Unknown GEO_PROVIDER: {name}")
+
+
+def geolocator_from_env(provider: GeoProvider = None) -> Geolocator:
+    cache = GeoCache(
+        max_size=int(os.getenv("GEO_CACHE_SIZE", "10000")),
+        ttl=float(os.getenv("GEO_CACHE_TTL", str(24 * 3600))),
+    )
+    return Geolocator(
+        provider or provider_from_env(),
+        cache=cache,
+        prefix_v4=int(os.getenv("GEO_CACHE_PREFIX_V4", "24")),
+        prefix_v6=int(os.getenv("GEO_CACHE_PREFIX_V6", "48")),
+    )
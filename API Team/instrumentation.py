@@ -0,0 +1,331 @@
+# 🔬 Per-request instrumentation (opt-in, INSTRUMENTATION=1)
+#
+# An ASGI middleware opens a trace per request. Code on the hot path marks
+# spans (`with span("hash"): ...`), engine events count every SQL statement,
+# and session events time ORM flushes and commits. When the response finishes,
+# the trace goes into Prometheus-format metrics served at /metrics, labelled
+# by route template, not raw path.
+#
+# A small fraction of requests (PROFILE_SAMPLE_RATE) can also be profiled.
+# While a sampled request runs, a thread samples the stacks of every thread,
+# both the event loop and the threadpool running the sync handlers. The
+# slowest PROFILE_KEEP profiles are kept as folded stacks (flamegraph.pl /
+# speedscope format) and served at /internal/profiles.
+#
+# With no trace active, span() is a single ContextVar lookup, so the markers
+# stay in the code when instrumentation is off.
+
+import heapq, itertools, os, random, sys, threading, time
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+import orjson
+from fastapi.responses import JSONResponse, PlainTextResponse
+from sqlalchemy import event
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SQL_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+IDLE_FILES = ("threading.py", "selectors.py", "queue.py")
+
+_current: ContextVar[Optional["RequestTrace"]] = ContextVar("request_trace", default=None)
+
+
+class RequestTrace:
+    __slots__ = ("spans", "sql_statements", "sql_seconds", "closed")
+
+    def __init__(self):
+        self.spans: Dict[str, float] = defaultdict(float)
+        self.sql_statements = 0
+        self.sql_seconds = 0.0
+        self.closed = False
+
+    def add(self, name: str, seconds: float):
+        # background tasks run after the response is sent, they don't count towards it
+        if not self.closed:
+            self.spans[name] += seconds
+
+
+def current_trace() -> Optional[RequestTrace]:
+    return _current.get()
+
+
+@contextmanager
+def span(name: str):
+    trace = _current.get()
+    if trace is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.add(name, time.perf_counter() - started)
+
+
+# ------------------ SQLAlchemy hooks ------------------ #
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["query_started"].pop()
+    trace = _current.get()
+    if trace is not None and not trace.closed:
+        trace.sql_statements += 1
+        trace.sql_seconds += time.perf_counter() - started
+
+
+def _handle_error(context):
+    # a failed statement never reaches after_cursor_execute
+    if context.connection is not None and context.connection.info.get("query_started"):
+        context.connection.info["query_started"].pop()
+
+
+def attach_engine(engine):
+    # a sync Engine; for an AsyncEngine pass engine.sync_engine
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+
+def _timed_session_phase(session_factory, phase: str, begin: str, end: str):
+    key = f"{phase}_started"
+
+    def on_begin(session, *args):
+        if _current.get() is not None:
+            session.info[key] = time.perf_counter()
+
+    def on_end(session, *args):
+        started = session.info.pop(key, None)
+        trace = _current.get()
+        if started is not None and trace is not None:
+            trace.add(phase, time.perf_counter() - started)
+
+    event.listen(session_factory, begin, on_begin)
+    event.listen(session_factory, end, on_end)
+
+
+def attach_sessions(session_factory):
+    _timed_session_phase(session_factory, "flush", "before_flush", "after_flush_postexec")
+    _timed_session_phase(session_factory, "commit", "before_commit", "after_commit")
+
+
+class TimedJSONResponse(JSONResponse):
+    # default_response_class of the app, so FastAPI's own rendering shows up as the "serialize" span.
+    # A plain JSONResponse encoded with orjson, ORJSONResponse is deprecated. orjson refuses non-string
+    # dict keys by default, the stdlib encoder it replaces turned them into strings
+    def render(self, content) -> bytes:
+        with span("serialize"):
+            return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+
+
+# ------------------ Metrics ------------------ #
+class Histogram:
+    __slots__ = ("buckets", "counts", "sum")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def lines(self, name: str, labels: str) -> List[str]:
+        out, cumulative = [], 0
+        for bound, count in zip(self.buckets + ("+Inf",), self.counts):
+            cumulative += count
+            out.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+        out.append(f"{name}_sum{{{labels}}} {self.sum}")
+        out.append(f"{name}_count{{{labels}}} {cumulative}")
+        return out
+
+
+class RequestMetrics:
+    def __init__(self, prefix: str = "survey"):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self.durations: Dict[tuple, Histogram] = {}
+        self.sql_counts: Dict[tuple, Histogram] = {}
+        self.sql_seconds: Counter = Counter()
+        self.span_seconds: Counter = Counter()
+        self.span_counts: Counter = Counter()
+
+    def observe(self, method: str, route: str, status: int, duration: float, trace: RequestTrace):
+        with self._lock:
+            key = (method, route, str(status))
+            if key not in self.durations:
+                self.durations[key] = Histogram(DURATION_BUCKETS)
+            self.durations[key].observe(duration)
+            if (method, route) not in self.sql_counts:
+                self.sql_counts[(method, route)] = Histogram(SQL_BUCKETS)
+            self.sql_counts[(method, route)].observe(trace.sql_statements)
+            self.sql_seconds[(method, route)] += trace.sql_seconds
+            for name, seconds in trace.spans.items():
+                self.span_seconds[(method, route, name)] += seconds
+                self.span_counts[(method, route, name)] += 1
+
+    def render(self) -> str:
+        p = self.prefix
+        with self._lock:
+            lines = [f"# HELP {p}_request_duration_seconds Time until the last response byte was sent",
+                     f"# TYPE {p}_request_duration_seconds histogram"]
+            for (method, route, status), hist in sorted(self.durations.items()):
+                lines += hist.lines(f"{p}_request_duration_seconds",
+                                    f'method="{method}",route="{route}",status="{status}"')
+            lines += [f"# HELP {p}_request_sql_statements SQL statements executed per request",
+                      f"# TYPE {p}_request_sql_statements histogram"]
+            for (method, route), hist in sorted(self.sql_counts.items()):
+                lines += hist.lines(f"{p}_request_sql_statements", f'method="{method}",route="{route}"')
+            lines += [f"# HELP {p}_request_sql_seconds_total Time spent executing SQL",
+                      f"# TYPE {p}_request_sql_seconds_total counter"]
+            for (method, route), seconds in sorted(self.sql_seconds.items()):
+                lines.append(f'{p}_request_sql_seconds_total{{method="{method}",route="{route}"}} {seconds}')
+            lines += [f"# HELP {p}_request_span_seconds_total Time spent in each instrumented span",
+                      f"# TYPE {p}_request_span_seconds_total counter"]
+            for (method, route, name), seconds in sorted(self.span_seconds.items()):
+                labels = f'method="{method}",route="{route}",span="{name}"'
+                lines.append(f"{p}_request_span_seconds_total{{{labels}}} {seconds}")
+            lines += [f"# HELP {p}_request_span_total Requests that entered each span",
+                      f"# TYPE {p}_request_span_total counter"]
+            for (method, route, name), count in sorted(self.span_counts.items()):
+                labels = f'method="{method}",route="{route}",span="{name}"'
+                lines.append(f"{p}_request_span_total{{{labels}}} {count}")
+        return "\n".join(lines) + "\n"
+
+
+# ------------------ Sampling profiler ------------------ #
+def _folded(frame) -> str:
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class SlowRequestProfiler:
+    # one sampled request at a time; other requests running meanwhile show up in its stacks too
+    def __init__(self, sample_rate: float = 0.01, interval: float = 0.005, keep: int = 20):
+        self.sample_rate = sample_rate
+        self.interval = interval
+        self.keep = keep
+        self._lock = threading.Lock()
+        self._active = False
+        self._stop = threading.Event()
+        self._stacks: Counter = Counter()
+        self._thread: Optional[threading.Thread] = None
+        self._slowest: List[tuple] = []  # min-heap of (duration, seq, profile)
+        self._seq = itertools.count()
+
+    def try_start(self) -> bool:
+        if self.sample_rate <= 0 or random.random() >= self.sample_rate:
+            return False
+        with self._lock:
+            if self._active:
+                return False
+            self._active = True
+        self._stacks = Counter()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._sample, name="request-profiler", daemon=True)
+        self._thread.start()
+        return True
+
+    def _sample(self):
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == me or os.path.basename(frame.f_code.co_filename) in IDLE_FILES:
+                    continue
+                self._stacks[_folded(frame)] += 1
+
+    def finish(self, method: str, path: str, route: str, duration: float):
+        self._stop.set()
+        self._thread.join()
+        profile = {"method": method, "path": path, "route": route, "duration_ms": round(duration * 1000, 3),
+                   "samples": sum(self._stacks.values()), "captured_at": time.time(),
+                   "folded": "\n".join(f"{stack} {n}" for stack, n in self._stacks.most_common())}
+        with self._lock:
+            entry = (duration, next(self._seq), profile)
+            if len(self._slowest) < self.keep:
+                heapq.heappush(self._slowest, entry)
+            elif duration > self._slowest[0][0]:
+                heapq.heapreplace(self._slowest, entry)
+            self._active = False
+
+    def profiles(self) -> List[dict]:
+        with self._lock:
+            return [profile for _, _, profile in sorted(self._slowest, reverse=True)]
+
+
+# ------------------ Middleware ------------------ #
+class InstrumentationMiddleware:
+    def __init__(self, app, metrics: RequestMetrics, profiler: SlowRequestProfiler = None):
+        self.app = app
+        self.metrics = metrics
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        trace = RequestTrace()
+        token = _current.set(trace)
+        profiling = self.profiler is not None and self.profiler.try_start()
+        started = time.perf_counter()
+        state = {"status": 500, "finished": None}
+
+        async def timed_send(message):
+            if message["type"] == "http.response.start":
+                state["status"] = message["status"]
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                state["finished"] = time.perf_counter()
+                trace.closed = True
+
+        try:
+            await self.app(scope, receive, timed_send)
+        finally:
+            _current.reset(token)
+            trace.closed = True
+            duration = (state["finished"] or time.perf_counter()) - started
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            self.metrics.observe(scope["method"], route, state["status"], duration, trace)
+            if profiling:
+                self.profiler.finish(scope["method"], scope["path"], route, duration)
+
+
+def install(app, engine=None, session_factory=None, profiler: SlowRequestProfiler = None,
+            internal_dependencies: List = None) -> RequestMetrics:
+    # an engine created later (in a lifespan) is hooked up with attach_engine once it exists;
+    # internal_dependencies guard /internal/profiles like the app's other /internal routes
+    metrics = RequestMetrics()
+    if engine is not None:
+        attach_engine(engine)
+    if session_factory is not None:
+        attach_sessions(session_factory)
+    app.add_middleware(InstrumentationMiddleware, metrics=metrics, profiler=profiler)
+
+    def prometheus_metrics():
+        return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+    def slow_request_profiles():
+        return profiler.profiles() if profiler is not None else []
+
+    app.add_api_route("/metrics", prometheus_metrics, methods=["GET"], include_in_schema=False)
+    app.add_api_route("/internal/profiles", slow_request_profiles, methods=["GET"],
+                      dependencies=internal_dependencies)
+    return metrics
+
+
+def profiler_from_env() -> Optional[SlowRequestProfiler]:
+    rate = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+    if rate <= 0:
+        return None
+    return SlowRequestProfiler(rate, interval=float(os.getenv("PROFILE_INTERVAL_MS", "5")) / 1000,
+                               keep=int(os.getenv("PROFILE_KEEP", "20")))
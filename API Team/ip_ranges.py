@@ -0,0 +1,230 @@
+# 🗺️ Offline IP-range -> location database
+#
+# Ranges are kept as sorted start/end columns and answered with a binary search,
+# so a lookup never leaves the process. The table can be loaded straight from a
+# CSV (start_ip,end_ip,city,region,country) or from the compact binary produced
+# by `python ip_ranges.py build ranges.csv ranges.ipdb`, which is memory-mapped
+# so every worker process shares the same pages.
+#
+# Binary layout (little-endian):
+#   header   "<4sIIIII"  magic, version, n_v4, n_v6, n_locations, blob_len
+#   v4       start[n_v4] u32, end[n_v4] u32, loc[n_v4] u32
+#   v6       start[n_v6] 16B, end[n_v6] 16B, loc[n_v6] u32
+#   strings  offsets[n_locations + 1] u32, utf-8 blob
+
+import argparse, array, bisect, csv, ipaddress, mmap, struct, sys, time
+from typing import List, Optional, Tuple
+
+MAGIC = b"IPRG"
+VERSION = 1
+HEADER = struct.Struct("<4sIIIII")
+
+
+def format_location(city: str, region: str, country: str) -> str:
+    return f"{city or ''}, {region or ''}, {country or ''}".strip(", ")
+
+
+class _KeyColumn:
+    # sequence view over fixed-width big-endian keys, so bisect compares bytes directly
+    def __init__(self, buf, width: int, count: int):
+        self._buf = buf
+        self._width = width
+        self._count = count
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, i: int) -> bytes:
+        start = i * self._width
+        return bytes(self._buf[start:start + self._width])
+
+
+def _u32_column(buf):
+    if sys.byteorder == "little":
+        return buf.cast("I")
+    col = array.array("I", bytes(buf))
+    col.byteswap()
+    return col
+
+
+class IpRangeDB:
+    def __init__(self, v4_start, v4_end, v4_loc, v6_start, v6_end, v6_loc, locations, closer=None):
+        self.v4_start, self.v4_end, self.v4_loc = v4_start, v4_end, v4_loc
+        self.v6_start, self.v6_end, self.v6_loc = v6_start, v6_end, v6_loc
+        self.locations = locations
+        self._closer = closer
+
+    def __len__(self):
+        return len(self.v4_start) + len(self.v6_start)
+
+    def lookup(self, ip: str) -> Optional[str]:
+        try:
+            addr = ipaddress.ip_address(ip.strip())
+        except ValueError:
+            return None
+        if addr.version == 4:
+            key, starts, ends, locs = int(addr), self.v4_start, self.v4_end, self.v4_loc
+        else:
+            key, starts, ends, locs = addr.packed, self.v6_start, self.v6_end, self.v6_loc
+        i = bisect.bisect_right(starts, key) - 1
+        if i < 0 or key > ends[i]:
+            return None
+        return self.locations[locs[i]]
+
+    def close(self):
+        if self._closer is not None:
+            self._closer()
+            self._closer = None
+
+    # ------------------ Loading ------------------ #
+    @classmethod
+    def from_rows(cls, rows: List[Tuple[str, str, str]]) -> "IpRangeDB":
+        v4, v6, locations = _index_rows(rows)
+        return cls(
+            array.array("I", [r[0] for r in v4]), array.array("I", [r[1] for r in v4]),
+            array.array("I", [r[2] for r in v4]),
+            [r[0] for r in v6], [r[1] for r in v6], array.array("I", [r[2] for r in v6]),
+            locations,
+        )
+
+    @classmethod
+    def from_csv(cls, path: str) -> "IpRangeDB":
+        return cls.from_rows(read_csv(path))
+
+    @classmethod
+    def from_binary(cls, path: str) -> "IpRangeDB":
+        with open(path, "rb") as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(mm)
+        magic, version, n_v4, n_v6, n_loc, blob_len = HEADER.unpack_from(view, 0)
+        if magic != MAGIC or version != VERSION:
+            view.release()
+            mm.close()
+            raise ValueError(f"{path} is not an IP range database (version {VERSION})")
+
+        offset = HEADER.size
+        views = [view]
+        def take(size):
+            nonlocal offset
+            part = view[offset:offset + size]
+            offset += size
+            views.append(part)
+            return part
+
+        def u32(size):
+            col = _u32_column(take(size))
+            if isinstance(col, memoryview):
+                views.append(col)
+            return col
+
+        v4_start, v4_end, v4_loc = u32(4 * n_v4), u32(4 * n_v4), u32(4 * n_v4)
+        v6_start = _KeyColumn(take(16 * n_v6), 16, n_v6)
+        v6_end = _KeyColumn(take(16 * n_v6), 16, n_v6)
+        v6_loc = u32(4 * n_v6)
+        loc_offsets = u32(4 * (n_loc + 1))
+        blob = bytes(take(blob_len))
+        # the location strings are few and small, decoding them once keeps lookups allocation free
+        locations = [blob[loc_offsets[i]:loc_offsets[i + 1]].decode("utf-8") for i in range(n_loc)]
+
+        def closer():
+            for part in reversed(views):
+                part.release()
+            mm.close()
+
+        return cls(v4_start, v4_end, v4_loc, v6_start, v6_end, v6_loc, locations, closer)
+
+    @classmethod
+    def open(cls, path: str) -> "IpRangeDB":
+        if path.endswith(".csv"):
+            return cls.from_csv(path)
+        return cls.from_binary(path)
+
+
+def read_csv(path: str) -> List[Tuple[str, str, str]]:
+    rows = []
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            rows.append((row["start_ip"], row["end_ip"],
+                         format_location(row.get("city"), row.get("region"), row.get("country"))))
+    return rows
+
+
+def _index_rows(rows):
+    locations, loc_ids = [], {}
+    v4, v6 = [], []
+    for start_ip, end_ip, location in rows:
+        start, end = ipaddress.ip_address(start_ip), ipaddress.ip_address(end_ip)
+        if start.version != end.version or start > end:
+            raise ValueError(f"Invalid range {start_ip} - {end_ip}")
+        loc_id = loc_ids.get(location)
+        if loc_id is None:
+            loc_id = loc_ids[location] = len(locations)
+            locations.append(location)
+        if start.version == 4:
+            v4.append((int(start), int(end), loc_id))
+        else:
+            v6.append((start.packed, end.packed, loc_id))
+
+    for ranges in (v4, v6):
+        ranges.sort()
+        for prev, cur in zip(ranges, ranges[1:]):
+            if cur[0] <= prev[1]:
+                raise ValueError("IP ranges overlap, the table must be disjoint")
+    return v4, v6, locations
+
+
+def write_binary(rows: List[Tuple[str, str, str]], path: str):
+    v4, v6, locations = _index_rows(rows)
+    encoded = [loc.encode("utf-8") for loc in locations]
+    offsets, pos = [], 0
+    for item in encoded:
+        offsets.append(pos)
+        pos += len(item)
+    offsets.append(pos)
+
+    def u32(values):
+        col = array.array("I", values)
+        if sys.byteorder != "little":
+            col.byteswap()
+        return col.tobytes()
+
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(v4), len(v6), len(locations), pos))
+        f.write(u32([r[0] for r in v4]))
+        f.write(u32([r[1] for r in v4]))
+        f.write(u32([r[2] for r in v4]))
+        f.write(b"".join(r[0] for r in v6))
+        f.write(b"".join(r[1] for r in v6))
+        f.write(u32([r[2] for r in v6]))
+        f.write(u32(offsets))
+        f.write(b"".join(encoded))
+
+
+# ------------------ CLI ------------------ #
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build and query the offline IP range database")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="compile a start_ip,end_ip,city,region,country CSV")
+    build.add_argument("csv_path")
+    build.add_argument("output")
+    lookup = sub.add_parser("lookup", help="look up addresses in a CSV or binary database")
+    lookup.add_argument("db_path")
+    lookup.add_argument("ips", nargs="+")
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        started = time.perf_counter()
+        rows = read_csv(args.csv_path)
+        write_binary(rows, args.output)
+        print(f"wrote {len(rows)} ranges to {args.output} in {time.perf_counter() - started:.2f}s")
+    else:
+        db = IpRangeDB.open(args.db_path)
+        for ip in args.ips:
+            started = time.perf_counter()
+            location = db.lookup(ip)
+            print(f"{ip}\t{location or 'Unknown'}\t{(time.perf_counter() - started) * 1e6:.1f}us")
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,8 @@
 from fastapi import FastAPI,Request,status,HTTPException,Form
+from fastapi.responses import JSONResponse
 from fastapi.security import HTTPAuthorizationCredentials,HTTPBearer
 from fastapi import Security
-from passlib.context import CryptContext
+from password_hashing import PasswordHasher,HashingBusy
 from jose import JWTError,jwt
 from datetime import timedelta,datetime,UTC
 
@@ -21,15 +22,24 @@ fake_db={
 }
 
 
-pwd_context=CryptContext(schemes=['bcrypt'],deprecated="auto")
-#u are hashing the password and comparing it with hashed password
+#u are hashing the password and comparing it with hashed password, this runs in a process pool so the event loop is not blocked
+hasher=PasswordHasher.from_env()
 
 #to place the token field manually
 security_scheme=HTTPBearer()
 
 
 async def verify_password(plain_password:str,hashed_password:str):
-    return pwd_context.verify(plain_password,hashed_password)
+    return await hasher.averify(plain_password,hashed_password)
+
+#when too many logins are waiting for the pool we send 429 instead of queueing forever
+@app.exception_handler(HashingBusy)
+async def hashing_busy_handler(request:Request,exc:HashingBusy):
+    return JSONResponse(status_code=429,content={"detail":"server busy, try again shortly"},headers={"Retry-After":"1"})
+
+@app.on_event("shutdown")
+def stop_hasher():
+    hasher.shutdown()
 
 #here u r authenticating the user here
 async def authenticate_user(username:str,password:str):
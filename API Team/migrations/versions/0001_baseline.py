@@ -0,0 +1,97 @@
+"""baseline: the schema survey-app4.py used to create at import time
+
+Revision ID: 0001_baseline
+Revises:
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0001_baseline"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "user",
+        sa.Column("user_id", sa.Integer(), primary_key=True),
+        sa.Column("full_name", sa.String(100), nullable=False),
+        sa.Column("email", sa.String(100), nullable=False),
+        sa.Column("education", sa.String(100), nullable=True),
+        sa.Column("income_bracket", sa.String(50), nullable=True),
+        sa.Column("profile_pic", sa.Text(), nullable=True),
+        sa.Column("gender", sa.String(10), nullable=False),
+        sa.Column("age", sa.String(10), nullable=False),
+        sa.Column("phone_number", sa.String(15), nullable=True),
+        sa.Column("hashed_password", sa.String(), nullable=False),
+        sa.Column("location", sa.String(), nullable=True),
+        sa.Column("is_active", sa.Boolean(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), nullable=True),
+    )
+    op.create_index("ix_user_user_id", "user", ["user_id"])
+    op.create_index("ix_user_email", "user", ["email"], unique=True)
+
+    op.create_table(
+        "category",
+        sa.Column("category_id", sa.Integer(), primary_key=True),
+        sa.Column("name", sa.String(100), nullable=False),
+        sa.Column("parent_id", sa.Integer(), sa.ForeignKey("category.category_id"), nullable=True),
+        sa.Column("description", sa.String(100), nullable=True),
+        sa.Column("is_active", sa.Boolean(), nullable=True),
+    )
+    op.create_index("ix_category_category_id", "category", ["category_id"])
+
+    op.create_table(
+        "question",
+        sa.Column("question_id", sa.Integer(), primary_key=True),
+        sa.Column("question_description", sa.String(100), nullable=False),
+        sa.Column("question_code", sa.String(20), nullable=True),
+    )
+    op.create_index("ix_question_question_id", "question", ["question_id"])
+
+    op.create_table(
+        "question_category",
+        sa.Column("question_id", sa.Integer(), sa.ForeignKey("question.question_id"), primary_key=True),
+        sa.Column("category_id", sa.Integer(), sa.ForeignKey("category.category_id"), primary_key=True),
+    )
+
+    op.create_table(
+        "company",
+        sa.Column("company_id", sa.Integer(), primary_key=True),
+        sa.Column("name", sa.String(150), nullable=False),
+        sa.Column("country", sa.String(100), nullable=True),
+        sa.Column("sector", sa.String(100), nullable=False),
+        sa.Column("parent_category", sa.Integer(), sa.ForeignKey("category.category_id"), nullable=False),
+    )
+    op.create_index("ix_company_company_id", "company", ["company_id"])
+
+    op.create_table(
+        "product",
+        sa.Column("product_id", sa.Integer(), primary_key=True),
+        sa.Column("name", sa.String(150), nullable=False),
+        sa.Column("description", sa.Text(), nullable=True),
+        sa.Column("image_url", sa.Text(), nullable=True),
+        sa.Column("company_id", sa.Integer(), sa.ForeignKey("company.company_id"), nullable=False),
+    )
+    op.create_index("ix_product_product_id", "product", ["product_id"])
+
+    op.create_table(
+        "response",
+        sa.Column("response_id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("user.user_id"), nullable=False),
+        sa.Column("question_id", sa.Integer(), sa.ForeignKey("question.question_id"), nullable=False),
+        sa.Column("category_id", sa.Integer(), sa.ForeignKey("category.category_id"), nullable=False),
+        sa.Column("product_id", sa.Integer(), sa.ForeignKey("product.product_id"), nullable=True),
+        sa.Column("answer_text", sa.Text(), nullable=False),
+        sa.Column("created_at", sa.TIMESTAMP(timezone=True), server_default=sa.func.now(), nullable=True),
+    )
+    op.create_index("ix_response_response_id", "response", ["response_id"])
+
+
+def downgrade():
+    for table in ("response", "product", "company", "question_category", "question", "category", "user"):
+        op.drop_table(table)
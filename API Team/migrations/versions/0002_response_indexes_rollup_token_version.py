@@ -0,0 +1,65 @@
+"""response indexes, analytics rollup and user token_version
+
+Revision ID: 0002_response_indexes
+Revises: 0001_baseline
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0002_response_indexes"
+down_revision = "0001_baseline"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    bind = op.get_bind()
+    is_postgres = bind.dialect.name == "postgresql"
+    # databases created by the import-time create_all may already have these two
+    inspector = sa.inspect(bind)
+    user_columns = {c["name"] for c in inspector.get_columns("user")}
+    has_rollup = inspector.has_table("response_rollup")
+
+    if "token_version" not in user_columns:
+        with op.batch_alter_table("user") as batch:
+            batch.add_column(sa.Column("token_version", sa.Integer(), server_default="0", nullable=False))
+
+    op.execute("UPDATE response SET created_at = CURRENT_TIMESTAMP WHERE created_at IS NULL")
+    with op.batch_alter_table("response") as batch:
+        batch.alter_column("created_at", existing_type=sa.TIMESTAMP(timezone=True), nullable=False)
+
+    # CONCURRENTLY would avoid the write lock on a live table, but can't run inside the migration transaction
+    op.create_index("ix_response_category_question_product", "response",
+                    ["category_id", "question_id", "product_id"])
+    op.create_index("ix_response_user_created_at", "response", ["user_id", "created_at"])
+    if is_postgres:
+        op.create_index("ix_response_created_at_brin", "response", ["created_at"], postgresql_using="brin")
+
+    if has_rollup:
+        return
+    op.create_table(
+        "response_rollup",
+        sa.Column("category_id", sa.Integer(), primary_key=True),
+        sa.Column("question_id", sa.Integer(), primary_key=True),
+        sa.Column("product_id", sa.Integer(), primary_key=True),
+        sa.Column("age", sa.String(10), primary_key=True),
+        sa.Column("gender", sa.String(10), primary_key=True),
+        sa.Column("income_bracket", sa.String(50), primary_key=True),
+        sa.Column("location", sa.String(100), primary_key=True),
+        sa.Column("answer", sa.String(100), primary_key=True),
+        sa.Column("response_count", sa.Integer(), nullable=False),
+    )
+
+
+def downgrade():
+    op.drop_table("response_rollup")
+    if op.get_bind().dialect.name == "postgresql":
+        op.drop_index("ix_response_created_at_brin", table_name="response")
+    op.drop_index("ix_response_user_created_at", table_name="response")
+    op.drop_index("ix_response_category_question_product", table_name="response")
+    with op.batch_alter_table("response") as batch:
+        batch.alter_column("created_at", existing_type=sa.TIMESTAMP(timezone=True), nullable=True)
+    with op.batch_alter_table("user") as batch:
+        batch.drop_column("token_version")
@@ -0,0 +1,27 @@
+"""row hashes for the Question Bank importer
+
+Revision ID: 0003_catalog_import_row
+Revises: 0002_response_indexes
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0003_catalog_import_row"
+down_revision = "0002_response_indexes"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "catalog_import_row",
+        sa.Column("sheet", sa.String(50), primary_key=True),
+        sa.Column("row_key", sa.String(20), primary_key=True),
+        sa.Column("content_hash", sa.String(32), nullable=False),
+    )
+
+
+def downgrade():
+    op.drop_table("catalog_import_row")
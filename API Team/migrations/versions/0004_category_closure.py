@@ -0,0 +1,41 @@
+"""category closure table for hierarchical categories
+
+Revision ID: 0004_category_closure
+Revises: 0003_catalog_import_row
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0004_category_closure"
+down_revision = "0003_catalog_import_row"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "category_closure",
+        sa.Column("ancestor_id", sa.Integer(), sa.ForeignKey("category.category_id", ondelete="CASCADE"),
+                  primary_key=True),
+        sa.Column("descendant_id", sa.Integer(), sa.ForeignKey("category.category_id", ondelete="CASCADE"),
+                  primary_key=True),
+        sa.Column("depth", sa.Integer(), nullable=False),
+    )
+    op.create_index("ix_category_closure_descendant", "category_closure", ["descendant_id", "ancestor_id"])
+    op.execute("""
+        WITH RECURSIVE tree(ancestor_id, descendant_id, depth) AS (
+            SELECT category_id, category_id, 0 FROM category
+            UNION ALL
+            SELECT tree.ancestor_id, category.category_id, tree.depth + 1
+            FROM tree JOIN category ON category.parent_id = tree.descendant_id
+            WHERE tree.depth < 32
+        )
+        INSERT INTO category_closure (ancestor_id, descendant_id, depth)
+        SELECT ancestor_id, descendant_id, depth FROM tree
+    """)
+
+
+def downgrade():
+    op.drop_table("category_closure")
@@ -0,0 +1,31 @@
+"""trigram indexes on product and company names for SEARCH_BACKEND=pg_trgm
+
+Revision ID: 0005_search_trgm
+Revises: 0004_category_closure
+Create Date: 2026-10-18
+"""
+from alembic import op
+
+
+revision = "0005_search_trgm"
+down_revision = "0004_category_closure"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # the in-memory backend needs nothing from the database, the indexes only matter on PostgreSQL
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.create_index("ix_product_name_trgm", "product", ["name"], postgresql_using="gin",
+                    postgresql_ops={"name": "gin_trgm_ops"})
+    op.create_index("ix_company_name_trgm", "company", ["name"], postgresql_using="gin",
+                    postgresql_ops={"name": "gin_trgm_ops"})
+
+
+def downgrade():
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    op.drop_index("ix_company_name_trgm", table_name="company")
+    op.drop_index("ix_product_name_trgm", table_name="product")
@@ -0,0 +1,25 @@
+"""profile image reference on user, images move to the content-addressed store
+
+Revision ID: 0006_user_profile_image
+Revises: 0005_search_trgm
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0006_user_profile_image"
+down_revision = "0005_search_trgm"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # the inline profile_pic column stays until `python profile_images.py backfill` has moved its contents
+    with op.batch_alter_table("user") as batch:
+        batch.add_column(sa.Column("profile_image", sa.String(80), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table("user") as batch:
+        batch.drop_column("profile_image")
@@ -0,0 +1,25 @@
+"""answer choices on question, the rollup only keys closed questions by answer
+
+Revision ID: 0007_question_answer_choices
+Revises: 0006_user_profile_image
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0007_question_answer_choices"
+down_revision = "0006_user_profile_image"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # existing questions stay free text until choices are set; re-run `python analytics.py rebuild` afterwards
+    with op.batch_alter_table("question") as batch:
+        batch.add_column(sa.Column("answer_choices", sa.Text(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table("question") as batch:
+        batch.drop_column("answer_choices")
@@ -0,0 +1,28 @@
+"""catalog_state row, bumped by catalog_import.py so workers drop their catalog caches
+
+Revision ID: 0008_catalog_state
+Revises: 0007_question_answer_choices
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0008_catalog_state"
+down_revision = "0007_question_answer_choices"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    state = op.create_table(
+        "catalog_state",
+        sa.Column("state_id", sa.Integer(), primary_key=True),
+        sa.Column("version", sa.Integer(), nullable=False),
+        sa.Column("changed_at", sa.DateTime(timezone=True), nullable=True),
+    )
+    op.bulk_insert(state, [{"state_id": 1, "version": 0}])
+
+
+def downgrade():
+    op.drop_table("catalog_state")
@@ -0,0 +1,31 @@
+"""updated_at on product and company, the search index refreshes by it instead of by max id
+
+Revision ID: 0009_catalog_updated_at
+Revises: 0008_catalog_state
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0009_catalog_updated_at"
+down_revision = "0008_catalog_state"
+branch_labels = None
+depends_on = None
+
+TABLES = ("company", "product")
+
+
+def upgrade():
+    # filled in by the models on insert and update (SQLite can't ALTER in a CURRENT_TIMESTAMP default)
+    for table in TABLES:
+        op.add_column(table, sa.Column("updated_at", sa.DateTime(timezone=True), nullable=True))
+        op.execute(f"UPDATE {table} SET updated_at = CURRENT_TIMESTAMP")
+        op.create_index(f"ix_{table}_updated_at", table, ["updated_at"])
+
+
+def downgrade():
+    for table in TABLES:
+        op.drop_index(f"ix_{table}_updated_at", table_name=table)
+        with op.batch_alter_table(table) as batch:
+            batch.drop_column("updated_at")
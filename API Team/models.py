@@ -0,0 +1,145 @@
+# 🗃️ SQLAlchemy models shared by the sync and async survey apps
+
+from sqlalchemy import (Column, Integer, String, Boolean, Text,
+                        DateTime, ForeignKey, Table, TIMESTAMP, func, Index, DDL, event)
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import relationship, deferred
+from datetime import datetime, UTC
+from typing import Literal
+
+Base = declarative_base()
+
+# ------------------ Literals ------------------ #
+AgeRange = Literal["15-20", "21-25", "26-30", "31-35", "36-40", "41-50", "51-60", "61-70", "71-80", "80+"]
+Gender = Literal["male", "female", "other"]
+
+# ------------------ Models ------------------ #
+class User(Base):
+    __tablename__ = "user"
+    user_id = Column(Integer, primary_key=True, index=True)
+    full_name = Column(String(100), nullable=False)
+    email = Column(String(100), unique=True, nullable=False, index=True)
+    education = Column(String(100), nullable=True)
+    income_bracket = Column(String(50), nullable=True)
+    # inline bytes from before the image store, never loaded unless asked for (profile_images.py backfill empties it)
+    profile_pic = deferred(Column(Text, nullable=True))
+    profile_image = Column(String(80), nullable=True)  # "<sha256>.<ext>" in the profile image store
+    gender = Column(String(10), nullable=False)
+    age = Column(String(10), nullable=False)
+    phone_number = Column(String(15), nullable=True)
+    hashed_password = Column(String, nullable=False)
+    location = Column(String, nullable=True)
+    is_active = Column(Boolean, default=True)
+    token_version = Column(Integer, default=0, server_default="0", nullable=False)
+    created_at = Column(DateTime, default=lambda: datetime.now(UTC), nullable=False)
+    updated_at = Column(DateTime, nullable=True)
+
+class Category(Base):
+    __tablename__ = "category"
+    category_id = Column(Integer, primary_key=True, index=True)
+    name = Column(String(100), nullable=False)
+    parent_id = Column(Integer, ForeignKey("category.category_id"), nullable=True)
+    description = Column(String(100), nullable=True)
+    is_active = Column(Boolean, default=True)
+
+# every (ancestor, descendant) pair of the category tree, including each category with itself at depth 0
+class CategoryClosure(Base):
+    __tablename__ = "category_closure"
+    ancestor_id = Column(Integer, ForeignKey("category.category_id", ondelete="CASCADE"), primary_key=True)
+    descendant_id = Column(Integer, ForeignKey("category.category_id", ondelete="CASCADE"), primary_key=True)
+    depth = Column(Integer, nullable=False)
+
+    __table_args__ = (Index("ix_category_closure_descendant", "descendant_id", "ancestor_id"),)
+
+class Question(Base):
+    __tablename__ = "question"
+    question_id = Column(Integer, primary_key=True, index=True)
+    question_description = Column(String(100), nullable=False)
+    question_code = Column(String(20), nullable=True)
+    # JSON list of the allowed answers, NULL for a free-text question (see analytics.answer_bucket)
+    answer_choices = Column(Text, nullable=True)
+
+question_category = Table(
+    "question_category",
+    Base.metadata,
+    Column("question_id", ForeignKey("question.question_id"), primary_key=True),
+    Column("category_id", ForeignKey("category.category_id"), primary_key=True)
+)
+
+class Company(Base):
+    __tablename__ = "company"
+    company_id = Column(Integer, primary_key=True, index=True)
+    name = Column(String(150), nullable=False)
+    country = Column(String(100), default="INDIA")
+    sector = Column(String(100), nullable=False)
+    parent_category = Column(Integer, ForeignKey("category.category_id"), nullable=False)
+    # the search index polls for rows changed since its last look (search_index.MemorySearch.refresh)
+    updated_at = Column(DateTime(timezone=True), default=func.now(), onupdate=func.now(), index=True)
+    __table_args__ = (
+        # SEARCH_BACKEND=pg_trgm: ILIKE '%term%' and similarity() on names
+        Index("ix_company_name_trgm", "name", postgresql_using="gin",
+              postgresql_ops={"name": "gin_trgm_ops"}).ddl_if(dialect="postgresql"),
+    )
+
+# the trigram indexes need the extension in place before the tables are created
+event.listen(Company.__table__, "before_create",
+             DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql"))
+
+class Product(Base):
+    __tablename__ = "product"
+    product_id = Column(Integer, primary_key=True, index=True)
+    name = Column(String(150), nullable=False)
+    description = Column(Text, nullable=True)
+    image_url = Column(Text, nullable=True)
+    company_id = Column(Integer, ForeignKey("company.company_id"), nullable=False)
+    company = relationship("Company")
+    updated_at = Column(DateTime(timezone=True), default=func.now(), onupdate=func.now(), index=True)
+    __table_args__ = (
+        Index("ix_product_name_trgm", "name", postgresql_using="gin",
+              postgresql_ops={"name": "gin_trgm_ops"}).ddl_if(dialect="postgresql"),
+    )
+
+class Response(Base):
+    __tablename__ = "response"
+    response_id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("user.user_id"), nullable=False)
+    question_id = Column(Integer, ForeignKey("question.question_id"), nullable=False)
+    category_id = Column(Integer, ForeignKey("category.category_id"), nullable=False)
+    product_id = Column(Integer, ForeignKey("product.product_id"), nullable=True)
+    answer_text = Column(Text, nullable=False)
+    created_at = Column(TIMESTAMP(timezone=True), server_default=func.now(), nullable=False)
+
+    __table_args__ = (
+        # per-category/question/product reporting and per-user history
+        Index("ix_response_category_question_product", "category_id", "question_id", "product_id"),
+        Index("ix_response_user_created_at", "user_id", "created_at"),
+        # created_at grows with insert order, so a BRIN index covers time ranges at a tiny size
+        Index("ix_response_created_at_brin", "created_at", postgresql_using="brin").ddl_if(dialect="postgresql"),
+    )
+
+# one row per (category, question, product, demographic slice, answer), kept up to date on ingest
+class ResponseRollup(Base):
+    __tablename__ = "response_rollup"
+    category_id = Column(Integer, primary_key=True)
+    question_id = Column(Integer, primary_key=True)
+    product_id = Column(Integer, primary_key=True)  # 0 when the answer has no product
+    age = Column(String(10), primary_key=True)
+    gender = Column(String(10), primary_key=True)
+    income_bracket = Column(String(50), primary_key=True)
+    location = Column(String(100), primary_key=True)  # country part of User.location
+    answer = Column(String(100), primary_key=True)
+    response_count = Column(Integer, nullable=False, default=0)
+
+# content hash of every spreadsheet row loaded by catalog_import.py, so re-imports skip unchanged rows
+class CatalogImportRow(Base):
+    __tablename__ = "catalog_import_row"
+    sheet = Column(String(50), primary_key=True)
+    row_key = Column(String(20), primary_key=True)  # the row's code in the workbook, e.g. "Q00001"
+    content_hash = Column(String(32), nullable=False)
+
+# one row; catalog_import.py bumps version after an import so every running worker drops its catalog caches
+class CatalogState(Base):
+    __tablename__ = "catalog_state"
+    state_id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+    changed_at = Column(DateTime(timezone=True), nullable=True)
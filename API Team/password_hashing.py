@@ -0,0 +1,165 @@
+# 🔐 bcrypt hashing off the request threads
+#
+# bcrypt at cost 12 is ~250ms of pure CPU, so hashes and verifications run in a
+# process pool sized to the cores. The number of jobs queued or running is
+# capped; past that HashingBusy is raised and the API answers 429 instead of
+# letting a login storm starve every other endpoint.
+
+import asyncio, multiprocessing, os, threading
+from threading import BrokenBarrierError
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Optional, Tuple
+
+from passlib.context import CryptContext
+
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+
+
+class HashingBusy(Exception):
+    pass
+
+
+def make_context(rounds: int = BCRYPT_ROUNDS) -> CryptContext:
+    # min == max == default, so hashes made at any other cost are flagged by needs_update
+    return CryptContext(
+        schemes=["bcrypt"], deprecated="auto",
+        bcrypt__default_rounds=rounds, bcrypt__min_rounds=rounds, bcrypt__max_rounds=rounds,
+    )
+
+
+# ------------------ Worker side ------------------ #
+_context: Optional[CryptContext] = None
+
+
+def _init_worker(rounds: int, started=None):
+    global _context
+    _context = make_context(rounds)
+    # loads the bcrypt backend now rather than on the first request
+    _context.hash("warm-up")
+    if started is not None:
+        # held here until every worker is up, so none of them is idle and each warm-up job spawns a new one
+        try:
+            started.wait(timeout=60)
+        except BrokenBarrierError:
+            pass
+
+
+def _hash(password: str, context: CryptContext = None) -> str:
+    return (context or _context).hash(password)
+
+
+def _verify_and_update(password: str, hashed: str, context: CryptContext = None) -> Tuple[bool, Optional[str]]:
+    return (context or _context).verify_and_update(password, hashed)
+
+
+# ------------------ Executor ------------------ #
+class PasswordHasher:
+    def __init__(self, rounds: int = BCRYPT_ROUNDS, workers: int = None, max_pending: int = None):
+        self.rounds = rounds
+        # workers=0 hashes in the calling thread, handy for scripts and local runs
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self.max_pending = max_pending or max(self.workers, 1) * 4
+        self._pending = 0
+        self._pending_lock = threading.Lock()
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pool_lock = threading.Lock()
+        self._context = make_context(rounds) if self.workers == 0 else None
+
+    @classmethod
+    def from_env(cls) -> "PasswordHasher":
+        workers = os.getenv("PASSWORD_HASH_WORKERS")
+        max_pending = os.getenv("PASSWORD_HASH_MAX_PENDING")
+        return cls(
+            rounds=BCRYPT_ROUNDS,
+            workers=int(workers) if workers is not None else None,
+            max_pending=int(max_pending) if max_pending else None,
+        )
+
+    def _get_pool(self, started=None) -> ProcessPoolExecutor:
+        with self._pool_lock:
+            if self._pool is None:
+                context = multiprocessing.get_context("spawn")
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=context,
+                    initializer=_init_worker,
+                    initargs=(self.rounds, started),
+                )
+            return self._pool
+
+    def _acquire(self):
+        with self._pending_lock:
+            if self._pending >= self.max_pending:
+                raise HashingBusy("Too many password operations in flight")
+            self._pending += 1
+
+    def _release(self, _=None):
+        with self._pending_lock:
+            self._pending -= 1
+
+    def _submit(self, fn, *args) -> Future:
+        self._acquire()
+        if self._context is not None:
+            future = Future()
+            try:
+                future.set_result(fn(*args, context=self._context))
+            except Exception as exc:
+                future.set_exception(exc)
+            finally:
+                self._release()
+            return future
+        try:
+            future = self._get_pool().submit(fn, *args)
+        except Exception:
+            self._release()
+            raise
+        future.add_done_callback(self._release)
+        return future
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    # blocking variants for sync handlers: the worker thread waits without holding the GIL
+    def hash(self, password: str) -> str:
+        return self._submit(_hash, password).result()
+
+    def verify_and_update(self, password: str, hashed: str) -> Tuple[bool, Optional[str]]:
+        return self._submit(_verify_and_update, password, hashed).result()
+
+    def verify(self, password: str, hashed: str) -> bool:
+        return self.verify_and_update(password, hashed)[0]
+
+    async def ahash(self, password: str) -> str:
+        return await asyncio.wrap_future(self._submit(_hash, password))
+
+    async def averify_and_update(self, password: str, hashed: str) -> Tuple[bool, Optional[str]]:
+        return await asyncio.wrap_future(self._submit(_verify_and_update, password, hashed))
+
+    async def averify(self, password: str, hashed: str) -> bool:
+        return (await self.averify_and_update(password, hashed))[0]
+
+    def warm_up(self):
+        # spawns every worker up front so the first logins don't pay for process start
+        if self.workers == 0:
+            self._context.hash("warm-up")
+            return
+        if self._pool is not None:
+            return
+        # the pool only starts a process when no worker is idle; the barrier keeps the first ones busy
+        # until all of them are running
+        started = multiprocessing.get_context("spawn").Barrier(self.workers + 1)
+        pool = self._get_pool(started)
+        futures = [pool.submit(_hash, "warm-up") for _ in range(self.workers)]
+        try:
+            started.wait(timeout=60)
+        except BrokenBarrierError:
+            pass
+        for future in futures:
+            future.result()
+
+    def shutdown(self):
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
@@ -0,0 +1,119 @@
+# 🧮 Query budgets for route handlers
+#
+# Every handler declares how many SQL statements it may issue:
+#
+#   @app.get("/category-details/{category_id}")
+#   @query_budget(3)
+#   def get_category_details(...): ...
+#
+# A budget can also be a function of the handler's arguments, for handlers
+# whose statement count grows with the input in fixed-size batches. Going over
+# the budget (a lazy load inside a loop, a forgotten joinedload) raises
+# QueryBudgetExceeded with QUERY_BUDGET_MODE=raise (tests, CI,
+# benchmarks/check_query_budgets.py) and logs a warning with the offending
+# statements in production (QUERY_BUDGET_MODE=log, the default). The
+# high-water mark per budget is kept in `high_water` for /internal/query-budgets.
+
+import functools, inspect, logging, os, threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Tuple, Union
+
+from sqlalchemy import event
+
+log = logging.getLogger(__name__)
+
+QUERY_BUDGET_MODE = os.getenv("QUERY_BUDGET_MODE", "log")  # "raise", "log" or "off"
+KEPT_STATEMENTS = 20
+
+_active: ContextVar[Tuple["QueryBudget", ...]] = ContextVar("query_budgets", default=())
+_lock = threading.Lock()
+high_water: Dict[str, int] = {}
+
+
+class QueryBudgetExceeded(AssertionError):
+    def __init__(self, budget: "QueryBudget"):
+        self.budget = budget
+        super().__init__(f"{budget.name} issued {budget.count} SQL statements, budget is {budget.limit}:\n"
+                         + "\n".join(f"  {s}" for s in budget.statements))
+
+
+class QueryBudget:
+    __slots__ = ("name", "limit", "count", "statements")
+
+    def __init__(self, name: str, limit: int):
+        self.name = name
+        self.limit = limit
+        self.count = 0
+        self.statements = []
+
+    def record(self, statement: str):
+        self.count += 1
+        if len(self.statements) < KEPT_STATEMENTS:
+            self.statements.append(" ".join(statement.split())[:200])
+
+    @property
+    def exceeded(self) -> bool:
+        return self.count > self.limit
+
+
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    for budget in _active.get():
+        budget.record(statement)
+
+
+def attach(engine):
+    # a sync Engine; for an AsyncEngine pass engine.sync_engine
+    event.listen(engine, "before_cursor_execute", _count_statement)
+
+
+def _settle(budget: QueryBudget, mode: str):
+    with _lock:
+        if budget.count > high_water.get(budget.name, -1):
+            high_water[budget.name] = budget.count
+    if budget.exceeded:
+        if mode == "raise":
+            raise QueryBudgetExceeded(budget)
+        log.warning("%s", QueryBudgetExceeded(budget))
+
+
+@contextmanager
+def budget_scope(limit: int, name: str, mode: str = None):
+    mode = mode or QUERY_BUDGET_MODE
+    budget = QueryBudget(name, limit)
+    if mode == "off":
+        yield budget
+        return
+    token = _active.set(_active.get() + (budget,))
+    try:
+        yield budget
+    finally:
+        _active.reset(token)
+    # only checked when the body finished cleanly, an exception in flight takes precedence
+    _settle(budget, mode)
+
+
+def query_budget(limit: Union[int, Callable[..., int]], name: str = None):
+    def decorate(fn):
+        label = name or fn.__qualname__
+
+        def resolve(kwargs) -> int:
+            return limit(**kwargs) if callable(limit) else limit
+
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def wrapper(*args, **kwargs):
+                with budget_scope(resolve(kwargs), label):
+                    return await fn(*args, **kwargs)
+        else:
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with budget_scope(resolve(kwargs), label):
+                    return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def reset_high_water():
+    with _lock:
+        high_water.clear()
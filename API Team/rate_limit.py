@@ -0,0 +1,231 @@
+# 🚦 Rate limiting for the expensive endpoints
+#
+# /token and /register each cost a bcrypt hash (and /register a geolocation
+# lookup), so they are guarded by token buckets keyed by client IP and by
+# email. The check runs as a route dependency, so a rejected request gets a 429
+# with Retry-After before any hashing or DB work.
+#
+# Rules come from the environment as "<requests>/<seconds>", e.g.
+# RATE_LIMIT_LOGIN_IP=20/60 allows bursts of 20 logins per IP, refilling to 20
+# over a minute. RATE_LIMIT_BACKEND picks where buckets live:
+#   local  (default) a dict in this process, evicted periodically; one worker's view only
+#   redis  shared by every worker through RATE_LIMIT_REDIS_URL (needs the redis package)
+#   off    no limiting, for benchmarks
+#
+# A request is checked against all of its buckets (per IP and per email) in one
+# step, and tokens are only spent when every bucket allows it. A request that
+# one key rejects doesn't drain the others.
+#
+# LocalBuckets takes an injectable clock, so tests can drive it without sleeping.
+
+import ipaddress, os, threading, time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+DEFAULT_RULES = {
+    "login:ip": "20/60",
+    "login:email": "5/60",
+    "register:ip": "10/3600",
+    "register:email": "3/3600",
+}
+# X-Forwarded-For is only believed when the connection comes from one of these (TRUSTED_PROXIES)
+DEFAULT_TRUSTED_PROXIES = "127.0.0.0/8,::1/128,10.0.0.0/8,172.16.0.0/12,192.168.0.0/16"
+
+
+class RateLimited(Exception):
+    def __init__(self, rule: str, retry_after: float):
+        self.rule = rule
+        self.retry_after = retry_after
+        super().__init__(f"rate limit {rule} exceeded, retry in {retry_after:.1f}s")
+
+
+class Rule:
+    __slots__ = ("name", "capacity", "per_second")
+
+    def __init__(self, name: str, capacity: int, seconds: float):
+        self.name = name
+        self.capacity = float(capacity)
+        self.per_second = capacity / seconds
+
+    @classmethod
+    def parse(cls, name: str, spec: str) -> "Rule":
+        # "20/60" -> 20 requests, refilled over 60 seconds
+        requests, _, seconds = spec.partition("/")
+        return cls(name, int(requests), float(seconds or 1))
+
+
+# ------------------ Backends ------------------ #
+class LocalBuckets:
+    # key -> (tokens, updated_at, full_at): three floats per client, nothing else
+    def __init__(self, clock: Callable[[], float] = time.monotonic,
+                 evict_interval: float = 60, max_keys: int = 500000):
+        self.clock = clock
+        self.evict_interval = evict_interval
+        self.max_keys = max_keys
+        self._buckets: Dict[str, Tuple[float, float, float]] = {}
+        self._lock = threading.Lock()
+        self._next_eviction = clock() + evict_interval
+
+    def take_all(self, entries: List[Tuple[str, Rule]], cost: float = 1.0) -> List[float]:
+        # one wait per (key, rule), 0 when allowed; nothing is spent unless every wait is 0
+        with self._lock:
+            now = self.clock()
+            if now >= self._next_eviction or len(self._buckets) >= self.max_keys:
+                self._evict(now)
+            levels = []
+            for key, rule in entries:
+                tokens, updated, _ = self._buckets.get(key, (rule.capacity, now, now))
+                levels.append(min(rule.capacity, tokens + (now - updated) * rule.per_second))
+            waits = [max(0.0, (cost - tokens) / rule.per_second) for tokens, (_, rule) in zip(levels, entries)]
+            spent = 0.0 if any(waits) else cost
+            for tokens, (key, rule) in zip(levels, entries):
+                tokens -= spent
+                self._buckets[key] = (tokens, now, now + (rule.capacity - tokens) / rule.per_second)
+            return waits
+
+    def take(self, key: str, rule: Rule, cost: float = 1.0) -> float:
+        # returns 0 when allowed, otherwise the seconds until `cost` tokens are back
+        return self.take_all([(key, rule)], cost)[0]
+
+    def _evict(self, now: float):
+        # a bucket that has refilled completely is the same as no bucket
+        self._next_eviction = now + self.evict_interval
+        self._buckets = {key: value for key, value in self._buckets.items() if value[2] > now}
+        if len(self._buckets) >= self.max_keys:
+            # still too many live clients: forget the least recently seen half
+            keep = sorted(self._buckets.items(), key=lambda item: item[1][1])[len(self._buckets) // 2:]
+            self._buckets = dict(keep)
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class RedisBuckets:
+    # the refill-check-take of all of a request's buckets runs as one Lua script, so concurrent workers
+    # can't both spend the last token. ARGV: cost, then capacity and per_second for each key
+    SCRIPT = """
+        local cost = tonumber(ARGV[1])
+        local t = redis.call('TIME')
+        local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+        local levels, waits, blocked = {}, {}, false
+        for i, key in ipairs(KEYS) do
+            local capacity, per_second = tonumber(ARGV[2 * i]), tonumber(ARGV[2 * i + 1])
+            local bucket = redis.call('HMGET', key, 'tokens', 'updated')
+            local tokens = tonumber(bucket[1]) or capacity
+            local updated = tonumber(bucket[2]) or now
+            levels[i] = math.min(capacity, tokens + (now - updated) * per_second)
+            waits[i] = 0
+            if levels[i] < cost then
+                waits[i] = (cost - levels[i]) / per_second
+                blocked = true
+            end
+        end
+        for i, key in ipairs(KEYS) do
+            local capacity, per_second = tonumber(ARGV[2 * i]), tonumber(ARGV[2 * i + 1])
+            local tokens = levels[i]
+            if not blocked then
+                tokens = tokens - cost
+            end
+            redis.call('HSET', key, 'tokens', tokens, 'updated', now)
+            redis.call('PEXPIRE', key, math.ceil((capacity - tokens) / per_second * 1000) + 1000)
+            -- Lua numbers come back as integers, the waits travel as strings
+            waits[i] = tostring(waits[i])
+        end
+        return waits
+    """
+
+    def __init__(self, url: str, prefix: str = "ratelimit:"):
+        import redis
+
+        self.prefix = prefix
+        self._client = redis.Redis.from_url(url, socket_timeout=0.5)
+        self._script = self._client.register_script(self.SCRIPT)
+
+    def take_all(self, entries: List[Tuple[str, Rule]], cost: float = 1.0) -> List[float]:
+        args = [cost]
+        for _, rule in entries:
+            args += [rule.capacity, rule.per_second]
+        waits = self._script(keys=[self.prefix + key for key, _ in entries], args=args)
+        return [float(wait) for wait in waits]
+
+    def take(self, key: str, rule: Rule, cost: float = 1.0) -> float:
+        return self.take_all([(key, rule)], cost)[0]
+
+
+# ------------------ Limiter ------------------ #
+class RateLimiter:
+    def __init__(self, backend, rules: Dict[str, Rule]):
+        self.backend = backend
+        self.rules = rules
+        self.rejected: Dict[str, int] = {name: 0 for name in rules}
+
+    def check(self, action: str, **keys: Optional[str]):
+        # check("login", ip="1.2.3.4", email="a@b.c") uses the rules "login:ip" and "login:email"
+        entries = []
+        for dimension, value in keys.items():
+            name = f"{action}:{dimension}"
+            rule = self.rules.get(name)
+            if rule is not None and value:
+                entries.append((f"{name}:{value}", rule))
+        if not entries:
+            return
+        waits = self.backend.take_all(entries)
+        if any(waits):
+            blocked = [(wait, rule.name) for wait, (_, rule) in zip(waits, entries) if wait > 0]
+            for _, name in blocked:
+                self.rejected[name] += 1
+            # the client has to wait for the slowest bucket anyway
+            retry_after, name = max(blocked)
+            raise RateLimited(name, retry_after)
+
+    def stats(self) -> dict:
+        return {"backend": type(self.backend).__name__, "rejected": dict(self.rejected),
+                **({"buckets": len(self.backend)} if isinstance(self.backend, LocalBuckets) else {})}
+
+
+class NoLimit:
+    def check(self, action: str, **keys):
+        pass
+
+    def stats(self) -> dict:
+        return {"backend": "off"}
+
+
+def limiter_from_env():
+    backend = os.getenv("RATE_LIMIT_BACKEND", "local")
+    if backend == "off":
+        return NoLimit()
+    rules = {name: Rule.parse(name, os.getenv("RATE_LIMIT_" + name.replace(":", "_").upper(), spec))
+             for name, spec in DEFAULT_RULES.items()}
+    if backend == "redis":
+        return RateLimiter(RedisBuckets(os.getenv("RATE_LIMIT_REDIS_URL", "redis://localhost:6379/0")), rules)
+    if backend == "local":
+        return RateLimiter(LocalBuckets(evict_interval=float(os.getenv("RATE_LIMIT_EVICT_INTERVAL", "60"))), rules)
+    raise ValueError(f"Unknown RATE_LIMIT_BACKEND: {backend}")
+
+
+# ------------------ Client address ------------------ #
+def parse_networks(spec: str):
+    return [ipaddress.ip_network(part.strip(), strict=False) for part in spec.split(",") if part.strip()]
+
+
+def _address(value: str):
+    try:
+        return ipaddress.ip_address(value.strip().strip("[]"))
+    except ValueError:
+        return None
+
+
+def client_ip(forwarded_for: Optional[str], peer: Optional[str], trusted: Iterable) -> str:
+    # walk the chain from the nearest hop back; the first address that isn't one of our proxies is the client.
+    # Anything left of it was written by the client itself and can't be trusted.
+    trusted = list(trusted)
+    hops = [peer or ""] + [hop for hop in reversed((forwarded_for or "").split(",")) if hop.strip()]
+    client = peer or "unknown"
+    for hop in hops:
+        address = _address(hop)
+        if address is None:
+            break
+        client = str(address)
+        if not any(address in network for network in trusted):
+            break
+    return client
@@ -0,0 +1,343 @@
+# 🚚 Write-behind buffer for survey answers
+#
+# Accepted rows are appended (and fsynced) to a local spill segment before the
+# request is acknowledged, then kept in memory until a background task flushes
+# them to the database in one large batch, either when batch_size rows are
+# waiting or every flush_interval seconds. A segment is deleted only after the
+# batch it holds has been committed, so a crash at any point loses nothing that
+# was acknowledged: start() replays whatever segments are left on disk.
+# Segments stay flock-ed while their rows are in memory, so several workers can
+# share a spill directory without replaying each other's live segments.
+#
+# When a batch fails, it is split in halves until the failing rows stand alone,
+# and everything else is committed. A row that keeps failing on its own (FK
+# violation, bad product_id, ...) is moved to dead-letter.jsonl in the spill
+# directory after max_attempts tries, so one poison row can't wedge the buffer.
+# If no part of the batch goes in at all, the database is taken to be down: the
+# whole batch is kept and retried as before, and no attempt is counted.
+
+import asyncio, glob, json, logging, math, os, threading, time
+from bisect import bisect_left
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: one worker per spill directory
+    fcntl = None
+
+log = logging.getLogger(__name__)
+
+DEAD_LETTER_FILE = "dead-letter.jsonl"
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+class BufferFull(Exception):
+    pass
+
+
+def _encode(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Cannot spill {type(value).__name__}")
+
+
+def _decode(row: dict) -> dict:
+    if isinstance(row.get("created_at"), str):
+        row["created_at"] = datetime.fromisoformat(row["created_at"])
+    return row
+
+
+class WriteBehindBuffer:
+    def __init__(self, flush_fn: Callable[[List[dict]], None], spill_dir: str,
+                 max_rows: int = 50000, batch_size: int = 5000, flush_interval: float = 0.5,
+                 fsync: bool = True, max_attempts: int = 3):
+        self.flush_fn = flush_fn
+        self.spill_dir = spill_dir
+        self.max_rows = max_rows
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.max_attempts = max_attempts
+
+        self._pending: List[dict] = []
+        self._sealed: List[str] = []
+        self._handles: Dict[str, object] = {}
+        self._segment = None
+        self._segment_path: Optional[str] = None
+        self._segment_seq = 0
+        # id(row) -> (row, failed attempts on its own), for rows already isolated by a split
+        self._attempts: Dict[int, Tuple[dict, int]] = {}
+        self._lock = threading.Lock()
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+
+        self.flushes = 0
+        self.flush_errors = 0
+        self.rows_flushed = 0
+        self.rows_rejected = 0
+        self.rows_dead_lettered = 0
+        self.last_flush_ms = 0.0
+        self.latency_counts = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.latency_sum_ms = 0.0
+
+    # ------------------ Spill segments ------------------ #
+    def _lock_file(self, path: str, mode: str):
+        handle = open(path, mode)
+        if fcntl is not None:
+            try:
+                fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                handle.close()
+                return None
+        self._handles[path] = handle
+        return handle
+
+    def _open_segment(self):
+        self._segment_seq += 1
+        name = f"responses-{int(time.time() * 1000)}-{os.getpid()}-{self._segment_seq}.jsonl"
+        self._segment_path = os.path.join(self.spill_dir, name)
+        self._segment = self._lock_file(self._segment_path, "ab")
+
+    def _seal_segment(self) -> str:
+        # the sealed file keeps its lock until the batch it holds is committed
+        path = self._segment_path
+        self._segment.flush()
+        self._open_segment()
+        return path
+
+    def _recover(self) -> List[str]:
+        recovered, rows = [], []
+        for path in sorted(glob.glob(os.path.join(self.spill_dir, "responses-*.jsonl"))):
+            handle = self._lock_file(path, "rb")
+            if handle is None:
+                continue  # owned by a live worker
+            recovered.append(path)
+            for line in handle:
+                # a torn last line means the process died before that request was acknowledged
+                try:
+                    rows.append(_decode(json.loads(line)))
+                except ValueError:
+                    pass
+        self._pending = rows
+        return recovered
+
+    # ------------------ Lifecycle ------------------ #
+    async def start(self):
+        os.makedirs(self.spill_dir, exist_ok=True)
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._sealed = self._recover()
+        self._open_segment()
+        if self._pending:
+            try:
+                await self.flush()
+            except Exception:
+                pass
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+        with self._lock:
+            if self._segment is not None:
+                if os.path.getsize(self._segment_path) == 0:
+                    self._remove([self._segment_path])
+                self._segment = None
+            for handle in self._handles.values():
+                handle.close()
+            self._handles.clear()
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception:
+                # rows stay buffered and spilled, the next tick retries them
+                pass
+
+    # ------------------ Writes ------------------ #
+    def put_many(self, rows: List[dict]):
+        if not rows:
+            return
+        payload = b"".join(json.dumps(row, default=_encode).encode("utf-8") + b"\n" for row in rows)
+        with self._lock:
+            if self._segment is None:
+                raise BufferFull("Write buffer is not running")
+            if len(self._pending) + len(rows) > self.max_rows:
+                self.rows_rejected += len(rows)
+                raise BufferFull("Write buffer is full")
+            self._segment.write(payload)
+            self._segment.flush()
+            if self.fsync:
+                os.fsync(self._segment.fileno())
+            self._pending.extend(rows)
+            full = len(self._pending) >= self.batch_size
+        if full:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    async def flush(self):
+        async with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, []
+                if not batch:
+                    # idle tick: the open segment is empty, keep it instead of sealing a new file each time
+                    segments, self._sealed = self._sealed, []
+                else:
+                    segments = self._sealed + [self._seal_segment()] if self._segment is not None else self._sealed
+                    self._sealed = []
+            if not batch:
+                self._remove(segments)
+                return
+
+            loop = asyncio.get_running_loop()
+            started = time.perf_counter()
+            try:
+                await loop.run_in_executor(None, self.flush_fn, batch)
+            except Exception:
+                self.flush_errors += 1
+                # rows that already failed on their own once are expected to fail, the rest suggest an outage
+                fresh = any(id(row) not in self._attempts for row in batch)
+                flushed, failed = await loop.run_in_executor(None, self._isolate, batch, fresh)
+                if not flushed and fresh:
+                    # nothing went in, most likely the database itself: keep the batch whole for the next tick
+                    with self._lock:
+                        self._pending = batch + self._pending
+                        self._sealed = segments + self._sealed
+                    raise
+                self._record(time.perf_counter() - started, len(flushed))
+                for row in flushed:
+                    self._attempts.pop(id(row), None)
+                self._set_aside(failed)
+                # the rows still owed are now in the open segment or the dead-letter file
+                self._remove(segments)
+                return
+            self._record(time.perf_counter() - started, len(batch))
+            for row in batch:
+                self._attempts.pop(id(row), None)
+            self._remove(segments)
+
+    def _isolate(self, batch: List[dict], give_up: bool = True) -> Tuple[List[dict], List[Tuple[dict, Exception]]]:
+        # halves the failed batch until failing rows stand alone; (flushed, [(row, error)]).
+        # With give_up, stops once more calls failed before any success than a single poison row can cause.
+        flushed, failed = [], []
+        limit = math.ceil(math.log2(len(batch))) + 2 if give_up and len(batch) > 1 else math.inf
+        streak = 0
+
+        def attempt(rows: List[dict]):
+            nonlocal streak
+            if not flushed and streak > limit:
+                failed.extend((row, None) for row in rows)
+                return
+            if len(rows) < len(batch):
+                try:
+                    self.flush_fn(rows)
+                    flushed.extend(rows)
+                    return
+                except Exception as exc:
+                    streak += 1
+                    if len(rows) == 1:
+                        failed.append((rows[0], exc))
+                        return
+            middle = len(rows) // 2
+            attempt(rows[:middle])
+            attempt(rows[middle:])
+
+        if len(batch) == 1:
+            # the whole-batch attempt already was the single-row attempt
+            try:
+                self.flush_fn(batch)
+                flushed.extend(batch)
+            except Exception as exc:
+                failed.append((batch[0], exc))
+            return flushed, failed
+        attempt(batch)
+        return flushed, failed
+
+    def _set_aside(self, failed: List[Tuple[dict, Exception]]):
+        retry, dead = [], []
+        for row, error in failed:
+            _, attempts = self._attempts.pop(id(row), (row, 0))
+            if error is not None:
+                attempts += 1
+            if attempts >= self.max_attempts:
+                dead.append({"row": row, "error": repr(error), "attempts": attempts,
+                             "dead_lettered_at": datetime.now().isoformat(timespec="seconds")})
+            else:
+                retry.append(row)
+                self._attempts[id(row)] = (row, attempts)
+        if dead:
+            with open(os.path.join(self.spill_dir, DEAD_LETTER_FILE), "ab") as f:
+                f.write(b"".join(json.dumps(entry, default=_encode).encode("utf-8") + b"\n" for entry in dead))
+                f.flush()
+                if self.fsync:
+                    os.fsync(f.fileno())
+            self.rows_dead_lettered += len(dead)
+            log.error("moved %d response rows to %s after %d failed attempts each: %s",
+                      len(dead), DEAD_LETTER_FILE, self.max_attempts, dead[0]["error"])
+        if retry:
+            # written again so they survive a crash once their old segments are gone; not counted against max_rows
+            payload = b"".join(json.dumps(row, default=_encode).encode("utf-8") + b"\n" for row in retry)
+            with self._lock:
+                self._segment.write(payload)
+                self._segment.flush()
+                if self.fsync:
+                    os.fsync(self._segment.fileno())
+                self._pending = retry + self._pending
+
+    def _remove(self, segments: List[str]):
+        for path in segments:
+            # unlink before unlocking so no other worker can pick the file up in between
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            handle = self._handles.pop(path, None)
+            if handle is not None:
+                handle.close()
+
+    # ------------------ Metrics ------------------ #
+    def _record(self, seconds: float, rows: int):
+        ms = seconds * 1000
+        self.flushes += 1
+        self.rows_flushed += rows
+        self.last_flush_ms = ms
+        self.latency_sum_ms += ms
+        self.latency_counts[bisect_left(LATENCY_BUCKETS_MS, ms)] += 1
+
+    @property
+    def depth(self) -> int:
+        return len(self._pending)
+
+    def metrics(self) -> dict:
+        return {
+            "queue_depth": self.depth,
+            "max_rows": self.max_rows,
+            "sealed_segments": len(self._sealed),
+            "flushes": self.flushes,
+            "flush_errors": self.flush_errors,
+            "rows_flushed": self.rows_flushed,
+            "rows_rejected": self.rows_rejected,
+            "rows_retrying": len(self._attempts),
+            "rows_dead_lettered": self.rows_dead_lettered,
+            "last_flush_ms": round(self.last_flush_ms, 3),
+            "flush_latency_ms": {
+                "buckets": {f"le_{b}": c for b, c in zip(LATENCY_BUCKETS_MS + ("inf",), self.latency_counts)},
+                "sum": round(self.latency_sum_ms, 3),
+                "count": self.flushes,
+            },
+        }
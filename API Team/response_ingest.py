@@ -0,0 +1,143 @@
+# 📝 Bulk ingestion of survey answers
+#
+# Answers are checked against an in-memory index of the catalog (which
+# questions belong to which category, which category each product is sold in)
+# instead of waiting for a foreign key error, and the accepted rows are written
+# in one round-trip: COPY on PostgreSQL/psycopg2, a single executemany with
+# insertmanyvalues batching everywhere else. Very large submissions go in
+# chunks of INSERT_CHUNK rows, so one request never builds an unbounded COPY
+# buffer or parameter list. A repeated answer to the same question (and
+# product) within one submission is rejected, the first one stands.
+
+import csv, io, threading, time
+from typing import Callable, Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+COPY_THRESHOLD = 100
+INSERT_CHUNK = 5000
+
+REJECT_QUESTION = "question_not_in_category"
+REJECT_PRODUCT = "product_not_in_category"
+REJECT_EMPTY = "empty_answer"
+REJECT_DUPLICATE = "duplicate_answer"
+
+
+class AnswerIndex:
+    def __init__(self, question_categories: Set[Tuple[int, int]], product_categories: Dict[int, int],
+                 question_choices: Dict[int, Optional[FrozenSet[str]]] = None):
+        self.question_categories = question_categories
+        self.product_categories = product_categories
+        # question_id -> allowed answers (None for free text), handed to the analytics rollup
+        self.question_choices = question_choices or {}
+
+    @classmethod
+    def load(cls, db: Session, question_category, product, company, question) -> "AnswerIndex":
+        from analytics import parse_choices
+
+        pairs = db.execute(
+            select(question_category.c.question_id, question_category.c.category_id, question.c.answer_choices)
+            .join(question, question.c.question_id == question_category.c.question_id)
+        ).all()
+        products = db.execute(
+            select(product.c.product_id, company.c.parent_category)
+            .join(company, product.c.company_id == company.c.company_id)
+        ).all()
+        return cls({(q, c) for q, c, _ in pairs}, {p: c for p, c in products},
+                   {q: parse_choices(choices) for q, _, choices in pairs})
+
+    def check(self, question_id: int, category_id: int, product_id: Optional[int]) -> Optional[str]:
+        if (question_id, category_id) not in self.question_categories:
+            return REJECT_QUESTION
+        if product_id is not None and self.product_categories.get(product_id) != category_id:
+            return REJECT_PRODUCT
+        return None
+
+
+class AnswerIndexCache:
+    # rebuilt when the catalog version moves on, or after ttl for changes made by other workers
+    def __init__(self, ttl: float = 300):
+        self.ttl = ttl
+        self._index: Optional[AnswerIndex] = None
+        self._version = None
+        self._expires_at = 0.0
+        self._lock = threading.Lock()
+
+    def current(self, version: int) -> Optional[AnswerIndex]:
+        index = self._index
+        if index is not None and self._version == version and self._expires_at > time.monotonic():
+            return index
+        return None
+
+    def get(self, version: int, loader: Callable[[], AnswerIndex]) -> AnswerIndex:
+        index = self.current(version)
+        if index is not None:
+            return index
+        with self._lock:
+            if self._index is None or self._version != version or self._expires_at <= time.monotonic():
+                self._index = loader()
+                self._version = version
+                self._expires_at = time.monotonic() + self.ttl
+            return self._index
+
+    def invalidate(self):
+        with self._lock:
+            self._index = None
+
+
+def validate_answers(index: AnswerIndex, user_id: int, answers: Iterable) -> Tuple[List[dict], List[dict]]:
+    rows, results = [], []
+    seen: Set[Tuple[int, int, Optional[int]]] = set()
+    for position, ans in enumerate(answers):
+        key = (ans.question_id, ans.category_id, ans.product_id)
+        reason = index.check(*key)
+        if reason is None and not ans.answer_text.strip():
+            reason = REJECT_EMPTY
+        if reason is None and key in seen:
+            reason = REJECT_DUPLICATE
+        if reason is None:
+            seen.add(key)
+            rows.append({
+                "user_id": user_id,
+                "question_id": ans.question_id,
+                "category_id": ans.category_id,
+                "product_id": ans.product_id,
+                "answer_text": ans.answer_text,
+            })
+            results.append({"index": position, "status": "accepted"})
+        else:
+            results.append({"index": position, "status": "rejected", "reason": reason})
+    return rows, results
+
+
+def _copy_rows(db: Session, table, rows: List[dict]):
+    columns = list(rows[0])
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    for row in rows:
+        writer.writerow([row[col] for col in columns])
+    buf.seek(0)
+    # the raw connection is the one the session's transaction is running on
+    cursor = db.connection().connection.cursor()
+    try:
+        cursor.copy_expert(
+            f'COPY "{table.name}" ({", ".join(columns)}) FROM STDIN WITH (FORMAT csv)', buf
+        )
+    finally:
+        cursor.close()
+
+
+def bulk_insert(db: Session, table, rows: List[dict], chunk_size: int = INSERT_CHUNK) -> int:
+    if not rows:
+        return 0
+    dialect = db.get_bind().dialect
+    copy = dialect.name == "postgresql" and dialect.driver == "psycopg2"
+    # all chunks run in the caller's transaction, a failure leaves none of them behind
+    for start in range(0, len(rows), chunk_size):
+        chunk = rows[start:start + chunk_size]
+        if copy and len(chunk) >= COPY_THRESHOLD:
+            _copy_rows(db, table, chunk)
+        else:
+            db.execute(table.insert(), chunk)
+    return len(rows)
@@ -0,0 +1,46 @@
+# 📐 Pydantic schemas for the survey API
+
+from typing import List, Optional
+from pydantic import BaseModel, ConfigDict
+
+class CategoryLiteral(str):
+    pass
+
+class QuestionOut(BaseModel):
+    question_id: int
+    question_description: str
+
+    model_config = ConfigDict(from_attributes=True)
+
+class CompanyOut(BaseModel):
+    company_id: int
+    name: str
+
+    model_config = ConfigDict(from_attributes=True)
+
+class ProductOut(BaseModel):
+    product_id: int
+    name: str
+    company: CompanyOut
+
+    model_config = ConfigDict(from_attributes=True)
+
+class CategoryDetails(BaseModel):
+    questions: List[QuestionOut]
+    companies: List[CompanyOut]
+    products: List[ProductOut]
+
+class AnswerIn(BaseModel):
+    question_id: int
+    category_id: int
+    product_id: int
+    answer_text: str
+
+# keyset pages: pass next_cursor back as ?after= for the next page, None once the listing is exhausted
+class ProductPage(BaseModel):
+    items: List[ProductOut]
+    next_cursor: Optional[int] = None
+
+class QuestionPage(BaseModel):
+    items: List[QuestionOut]
+    next_cursor: Optional[int] = None
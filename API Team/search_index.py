@@ -0,0 +1,349 @@
+# 🔎 Typeahead search over product and company names
+#
+# SEARCH_BACKEND=memory (default) answers /search from an in-process inverted
+# index: every word of a name is indexed under each of its prefixes (up to
+# MAX_PREFIX characters), with postings kept as compact, ascending uint32
+# arrays. A query intersects the posting lists of its words by leapfrogging
+# with bisect and stops once it has `limit` hits, so a lookup costs about the
+# same with 1k or 1M names and never touches the database.
+#
+# The index is built in a worker thread at startup. After that it stays
+# current in three ways:
+#   * changes committed through this process are applied right away
+#     (after_commit). While a rebuild is scanning they are also buffered and
+#     replayed onto the new index before it is swapped in;
+#   * rows added or renamed by other processes (importer, other workers) are
+#     picked up every SEARCH_REFRESH_INTERVAL by polling updated_at. The poll
+#     reaches REFRESH_OVERLAP back past the newest change seen, so a
+#     transaction that committed a little after it stamped its rows isn't missed;
+#   * a full rebuild every SEARCH_REBUILD_INTERVAL catches deletes made
+#     elsewhere.
+#
+# SEARCH_BACKEND=pg_trgm sends the query to PostgreSQL instead, using the
+# trigram GIN indexes on product.name and company.name (migration 0005).
+
+import asyncio, logging, os, re, threading, time
+from array import array
+from bisect import bisect_left
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import select, text
+
+from models import Company, Product
+
+log = logging.getLogger(__name__)
+
+MAX_PREFIX = 12
+REFRESH_OVERLAP = timedelta(seconds=60)
+
+_WORD = re.compile(r"[^\W_]+")
+
+
+def words(name: str) -> List[str]:
+    # "Lay's Classic" -> ["lays", "classic"]
+    return _WORD.findall(name.casefold().replace("'", "").replace("’", ""))
+
+
+def _intersect(lists: List[array]):
+    # leapfrog over ascending posting lists, bisect skips whole runs of non-matching docs
+    first, rest = lists[0], lists[1:]
+    if not rest:
+        yield from first
+        return
+    positions = [0] * len(rest)
+    i, end = 0, len(first)
+    while i < end:
+        doc = first[i]
+        for n, posting in enumerate(rest):
+            j = positions[n] = bisect_left(posting, doc, positions[n])
+            if j == len(posting):
+                return
+            if posting[j] != doc:
+                # jump the shortest list to the first doc that can still match
+                i = bisect_left(first, posting[j], i + 1)
+                break
+        else:
+            yield doc
+            i += 1
+
+
+class SearchIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        # internal doc number -> (kind, id, name, words, company_id), None once removed or replaced
+        self._docs: List[Optional[tuple]] = []
+        self._by_key: Dict[Tuple[str, int], int] = {}
+        self._postings: Dict[str, array] = {}
+        # newest updated_at loaded from the database, the next refresh starts from there
+        self.changed_through: Optional[datetime] = None
+        self.ready = False
+        self.built_at = 0.0
+
+    def __len__(self):
+        return len(self._by_key)
+
+    def _add(self, kind: str, id: int, name: str, company_id: Optional[int]):
+        old = self._by_key.get((kind, id))
+        if old is not None:
+            entry = self._docs[old]
+            # refreshes overlap, a row seen again unchanged keeps its doc
+            if entry[2] == name and entry[4] == company_id:
+                return
+            self._docs[old] = None
+        doc = len(self._docs)
+        doc_words = tuple(words(name))
+        self._docs.append((kind, id, name, doc_words, company_id))
+        self._by_key[(kind, id)] = doc
+        postings = self._postings
+        for prefix in {w[:n] for w in doc_words for n in range(1, min(len(w), MAX_PREFIX) + 1)}:
+            posting = postings.get(prefix)
+            if posting is None:
+                posting = postings[prefix] = array("I")
+            posting.append(doc)
+
+    def upsert(self, kind: str, id: int, name: str, company_id: Optional[int] = None):
+        with self._lock:
+            self._add(kind, id, name, company_id)
+
+    def upsert_many(self, rows: Iterable[tuple]):
+        with self._lock:
+            for kind, id, name, company_id in rows:
+                self._add(kind, id, name, company_id)
+
+    def remove(self, kind: str, id: int):
+        with self._lock:
+            doc = self._by_key.pop((kind, id), None)
+            if doc is not None:
+                self._docs[doc] = None
+
+    @classmethod
+    def build(cls, rows: Iterable[tuple]) -> "SearchIndex":
+        # shorter names get lower doc numbers, so they come first in results
+        index = cls()
+        index.upsert_many(sorted(rows, key=lambda row: (len(row[2]), row[2].casefold())))
+        index.ready = True
+        index.built_at = time.time()
+        return index
+
+    def search(self, query: str, limit: int = 10, kind: str = None) -> List[dict]:
+        terms = words(query)
+        if not terms:
+            return []
+        lists = []
+        for term in terms:
+            posting = self._postings.get(term[:MAX_PREFIX])
+            if posting is None:
+                return []
+            lists.append(posting)
+        lists.sort(key=len)
+        # a word longer than MAX_PREFIX only narrows to its first MAX_PREFIX characters, check the rest per doc
+        long_terms = [t for t in terms if len(t) > MAX_PREFIX]
+        docs, hits = self._docs, []
+        for doc in _intersect(lists):
+            entry = docs[doc]
+            if entry is None or (kind and entry[0] != kind):
+                continue
+            if long_terms and not all(any(w.startswith(t) for w in entry[3]) for t in long_terms):
+                continue
+            hits.append(entry)
+            if len(hits) >= limit:
+                break
+        return [self._result(entry) for entry in hits]
+
+    def _result(self, entry: tuple) -> dict:
+        kind, id, name, _, company_id = entry
+        result = {"type": kind, "id": id, "name": name}
+        if kind == "product":
+            company_doc = self._by_key.get(("company", company_id))
+            company = self._docs[company_doc] if company_doc is not None else None
+            result["company"] = {"company_id": company_id, "name": company[2] if company else None}
+        return result
+
+
+# ------------------ Loading and refresh ------------------ #
+def catalog_rows(db, since: datetime = None, batch_size: int = 10000):
+    # (kind, id, name, company_id, updated_at), everything or only rows changed since `since`
+    companies = select(Company.company_id, Company.name, Company.updated_at)
+    products = select(Product.product_id, Product.name, Product.company_id, Product.updated_at)
+    if since is not None:
+        companies = companies.where(Company.updated_at >= since)
+        products = products.where(Product.updated_at >= since)
+    for company_id, name, updated_at in db.execute(companies.execution_options(yield_per=batch_size)):
+        yield "company", company_id, name, None, updated_at
+    for product_id, name, company_id, updated_at in db.execute(products.execution_options(yield_per=batch_size)):
+        yield "product", product_id, name, company_id, updated_at
+
+
+def load(db, since: datetime = None) -> Tuple[List[tuple], Optional[datetime]]:
+    rows, newest = [], since
+    for kind, id, name, company_id, updated_at in catalog_rows(db, since):
+        rows.append((kind, id, name, company_id))
+        if updated_at is not None and (newest is None or updated_at > newest):
+            newest = updated_at
+    return rows, newest
+
+
+class MemorySearch:
+    name = "memory"
+
+    def __init__(self, session_factory, refresh_interval: float = 30, rebuild_interval: float = 3600):
+        self.session_factory = session_factory
+        self.refresh_interval = refresh_interval
+        self.rebuild_interval = rebuild_interval
+        self.index = SearchIndex()
+        # one rebuild or refresh at a time; _pending collects apply() calls while a rebuild scans
+        self._loading = threading.Lock()
+        self._pending_lock = threading.Lock()
+        self._pending: Optional[List[tuple]] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def search(self, query: str, limit: int = 10, kind: str = None, db=None) -> List[dict]:
+        return self.index.search(query, limit, kind)
+
+    def rebuild(self):
+        with self._loading:
+            with self._pending_lock:
+                self._pending = []
+            index = None
+            try:
+                db = self.session_factory()
+                try:
+                    rows, newest = load(db)
+                finally:
+                    db.close()
+                index = SearchIndex.build(rows)
+                index.changed_through = newest
+            finally:
+                with self._pending_lock:
+                    pending, self._pending = self._pending, None
+                    if index is not None:
+                        # commits that landed while the scan ran, the scan may have read them before they did
+                        for upserts, removals in pending:
+                            self._apply_to(index, upserts, removals)
+                        # swapped in whole, queries never see a half-built index
+                        self.index = index
+
+    def refresh(self):
+        with self._loading:
+            index = self.index
+            since = index.changed_through - REFRESH_OVERLAP if index.changed_through is not None else None
+            db = self.session_factory()
+            try:
+                rows, newest = load(db, since)
+            finally:
+                db.close()
+            index.upsert_many(rows)
+            # nothing matched hands `since` back, which is behind where we were
+            if newest is not None and (index.changed_through is None or newest > index.changed_through):
+                index.changed_through = newest
+
+    def apply(self, upserts: List[tuple], removals: List[tuple]):
+        # called after commit with the Product/Company rows this process changed
+        with self._pending_lock:
+            if self._pending is not None:
+                self._pending.append((upserts, removals))
+            self._apply_to(self.index, upserts, removals)
+
+    @staticmethod
+    def _apply_to(index: SearchIndex, upserts: List[tuple], removals: List[tuple]):
+        if upserts:
+            index.upsert_many(upserts)
+        for kind, id in removals:
+            index.remove(kind, id)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            # until the first build succeeds every tick retries it
+            step = self.rebuild if time.time() - self.index.built_at >= self.rebuild_interval else self.refresh
+            try:
+                await loop.run_in_executor(None, step)
+            except Exception:
+                # the current index keeps serving
+                log.exception("search index %s failed", step.__name__)
+            await asyncio.sleep(self.refresh_interval)
+
+    async def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    def stats(self) -> dict:
+        index = self.index
+        return {"backend": self.name, "ready": index.ready, "documents": len(index),
+                "prefixes": len(index._postings), "built_at": index.built_at}
+
+
+class PgTrgmSearch:
+    name = "pg_trgm"
+
+    QUERY = text("""
+        (SELECT 'product' AS kind, p.product_id AS id, p.name, c.company_id, c.name AS company_name,
+                similarity(p.name, :q) AS score
+         FROM product p JOIN company c ON c.company_id = p.company_id
+         WHERE (:kind IS NULL OR :kind = 'product') AND p.name ILIKE :pattern
+         ORDER BY score DESC, length(p.name) LIMIT :limit)
+        UNION ALL
+        (SELECT 'company', c.company_id, c.name, NULL, NULL, similarity(c.name, :q) AS score
+         FROM company c
+         WHERE (:kind IS NULL OR :kind = 'company') AND c.name ILIKE :pattern
+         ORDER BY score DESC, length(c.name) LIMIT :limit)
+        ORDER BY score DESC LIMIT :limit
+    """)
+
+    def __init__(self, session_factory):
+        self.session_factory = session_factory
+
+    def search(self, query: str, limit: int = 10, kind: str = None, db=None) -> List[dict]:
+        # runs on the request's session when there is one
+        query = query.strip()
+        if not query:
+            return []
+        pattern = "%" + query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        own_session = db is None
+        db = self.session_factory() if own_session else db
+        try:
+            rows = db.execute(self.QUERY, {"q": query, "pattern": pattern, "kind": kind, "limit": limit}).all()
+        finally:
+            if own_session:
+                db.close()
+        results = []
+        for row in rows:
+            result = {"type": row.kind, "id": row.id, "name": row.name}
+            if row.kind == "product":
+                result["company"] = {"company_id": row.company_id, "name": row.company_name}
+            results.append(result)
+        return results
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    def rebuild(self):
+        pass
+
+    def apply(self, upserts, removals):
+        pass
+
+    def stats(self) -> dict:
+        return {"backend": self.name, "ready": True}
+
+
+def search_from_env(session_factory):
+    backend = os.getenv("SEARCH_BACKEND", "memory")
+    if backend == "pg_trgm":
+        return PgTrgmSearch(session_factory)
+    if backend == "memory":
+        return MemorySearch(session_factory,
+                            refresh_interval=float(os.getenv("SEARCH_REFRESH_INTERVAL", "30")),
+                            rebuild_interval=float(os.getenv("SEARCH_REBUILD_INTERVAL", "3600")))
+    raise ValueError(f"Unknown SEARCH_BACKEND: {backend}")
@@ -163,4 +163,6 @@ def get_profile(current_user: User = Depends(get_current_user)):
     }
 
 # ------------------ DB Init ------------------ #
-Base.metadata.create_all(bind=engine)
+# run once with `python survey-app3.py`, not on every import: workers boot without a DDL round-trip
+if __name__ == "__main__":
+    Base.metadata.create_all(bind=engine)
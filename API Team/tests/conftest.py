@@ -0,0 +1,6 @@
+# the app modules live one directory up, next to the app files
+import os, sys
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if APP_DIR not in sys.path:
+    sys.path.insert(0, APP_DIR)
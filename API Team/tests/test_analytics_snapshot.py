@@ -0,0 +1,115 @@
+# Columnar snapshot answers must match the same GROUP BY run on the database,
+# on both sides of DENSE_CELLS (bincount and np.unique)
+
+import json, random
+from collections import Counter
+from datetime import datetime, timedelta
+
+import pytest
+
+pytest.importorskip("numpy")
+pytest.importorskip("sqlalchemy")
+from sqlalchemy import case, create_engine, func, select
+from sqlalchemy.orm import sessionmaker
+
+import analytics_snapshot
+from analytics import OTHER, UNKNOWN
+from models import Base, Question, Response, User
+
+CHOICES = {1: ["Yes", "No"], 2: ["Good", "Okay", "Bad"], 3: None}
+ANSWERS = ["yes", " Yes", "NO", "good", "okay ", "Bad", "meh", "no idea"]
+START = datetime(2026, 1, 1)
+
+
+@pytest.fixture(scope="module")
+def seeded(tmp_path_factory):
+    root = tmp_path_factory.mktemp("snapshot")
+    engine = create_engine(f"sqlite:///{root / 'survey.db'}")
+    Base.metadata.create_all(engine)
+    rng = random.Random(7)
+    users = [{"user_id": n, "full_name": "U", "email": f"u{n}@example.com", "hashed_password": "-",
+              "age": rng.choice(["15-20", "21-25", "26-30"]), "gender": rng.choice(["male", "female", "other"]),
+              "income_bracket": rng.choice(["low", "high", None]),
+              # bare country codes, which location_bucket leaves as they are
+              "location": rng.choice(["IN", "US", None]), "created_at": START}
+             for n in range(1, 61)]
+
+    def responses(first, count):
+        return [{"response_id": n, "user_id": rng.randint(1, 60), "question_id": rng.randint(1, 3),
+                 "category_id": rng.randint(1, 2), "product_id": rng.choice([None, 1, 2]),
+                 "answer_text": rng.choice(ANSWERS), "created_at": START + timedelta(hours=n)}
+                for n in range(first, first + count)]
+
+    with engine.begin() as conn:
+        conn.execute(Question.__table__.insert(), [
+            {"question_id": q, "question_description": "How was it?",
+             "answer_choices": json.dumps(choices) if choices else None} for q, choices in CHOICES.items()])
+        conn.execute(User.__table__.insert(), users)
+        conn.execute(Response.__table__.insert(), responses(1, 2500))
+    service = analytics_snapshot.SnapshotAnalytics(sessionmaker(bind=engine), str(root / "snap"), mode="refresh",
+                                                   segment_rows=600)
+    service.refresh()
+    # an incremental refresh on top, so queries span full-build and appended segments
+    with engine.begin() as conn:
+        conn.execute(Response.__table__.insert(), responses(2501, 400))
+    service.refresh()
+    assert len(service.snapshot.segments) > 1
+    yield engine, service
+    engine.dispose()
+
+
+def column(name):
+    return func.coalesce(getattr(User, name), UNKNOWN)
+
+
+def expected(engine, category_id, question_id, product_id, group_by, filters, since=None):
+    if CHOICES[question_id] is None:
+        # free-text questions aren't copied into the snapshot
+        return Counter()
+    choices = [choice.lower() for choice in CHOICES[question_id]]
+    normalized = func.lower(func.trim(Response.answer_text))
+    answer = case((normalized.in_(choices), normalized), else_=OTHER)
+    groups = [column(name) for name in group_by]
+    stmt = (select(*groups, answer, func.count())
+            .join(User, User.user_id == Response.user_id)
+            .where(Response.category_id == category_id, Response.question_id == question_id)
+            .group_by(*groups, answer))
+    if product_id is not None:
+        stmt = stmt.where(func.coalesce(Response.product_id, 0) == product_id)
+    for name, value in filters.items():
+        stmt = stmt.where(column(name) == value)
+    if since is not None:
+        stmt = stmt.where(Response.created_at >= since)
+    with engine.connect() as conn:
+        return Counter({(tuple(row[:-2]), row[-2]): row[-1] for row in conn.execute(stmt)})
+
+
+def counted(result):
+    return Counter({(tuple(group["group"][name] for name in result["group_by"]), answer): n
+                    for group in result["groups"] for answer, n in group["answers"].items()})
+
+
+CASES = [
+    (1, 1, None, [], {}, None),
+    (1, 2, 1, ["age", "gender"], {}, None),
+    (2, 1, 0, ["location"], {"gender": "male"}, None),
+    (2, 2, None, ["income_bracket", "age", "location"], {"location": "IN"}, START + timedelta(hours=1200)),
+    (1, 1, 2, ["age"], {"gender": "nobody"}, None),
+    (2, 3, None, ["age"], {}, None),
+]
+
+
+@pytest.mark.parametrize("dense_cells", [analytics_snapshot.DENSE_CELLS, 1], ids=["bincount", "unique"])
+@pytest.mark.parametrize("category_id, question_id, product_id, group_by, filters, since", CASES)
+def test_distribution_matches_group_by(seeded, monkeypatch, dense_cells,
+                                       category_id, question_id, product_id, group_by, filters, since):
+    engine, service = seeded
+    monkeypatch.setattr(analytics_snapshot, "DENSE_CELLS", dense_cells)
+    result = service.distribution(category_id, question_id, product_id, group_by, filters, since=since)
+    want = expected(engine, category_id, question_id, product_id, group_by, filters, since)
+    assert counted(result) == want
+    assert result["total"] == sum(want.values())
+    assert [group["total"] for group in result["groups"]] == [sum(group["answers"].values())
+                                                              for group in result["groups"]]
+    if question_id != 3 and "nobody" not in filters.values():
+        assert want
@@ -0,0 +1,88 @@
+# Question Bank import into a fresh SQLite database: idempotent re-runs, duplicate codes, unknown parents
+
+import os
+
+import pytest
+
+sqlalchemy = pytest.importorskip("sqlalchemy")
+from sqlalchemy import create_engine, event, select
+
+from catalog_import import DEFAULT_WORKBOOK, CatalogImporter
+from models import Base, Category, Company
+
+
+class Sheet:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def iter_rows(self, values_only=True):
+        return iter(self.rows)
+
+
+def workbook(categories=(), companies=()):
+    return {
+        "Categories": Sheet([("Category No", "Category", "Parent Category"), *categories]),
+        "Questions": Sheet([("QID", "Questions", "Category No"), ("Q00001", "How was it?", "C0001")]),
+        "Company Master": Sheet([("Company ID", "Company Name", "Parent Category ID"), *companies]),
+        "Products": Sheet([("Product No", "Product", "Company ID"), ("P0001", "Chips", "CID1")]),
+    }
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'catalog.db'}")
+
+    @event.listens_for(engine, "connect")
+    def foreign_keys(connection, _):
+        connection.execute("PRAGMA foreign_keys=ON")
+
+    Base.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+def run(engine, book):
+    with engine.begin() as conn:
+        return CatalogImporter(conn, batch_size=2).run(book)
+
+
+def written(results):
+    return sum(stats.written for stats in results)
+
+
+def test_duplicate_codes_last_row_wins_and_rerun_writes_nothing(engine):
+    book = workbook(categories=[("C0001", "Food", None)],
+                    companies=[("CID1", "Acme", "C0001"), ("CID2", "Old name", "C0001"),
+                               ("CID3", "Other", "C0001"), ("CID2", "New name", "C0001")])
+    first = run(engine, book)
+    companies = first[2]
+    assert companies.written == 3
+    assert companies.skipped == ["Company Master row 3: duplicate key CID2, row 5 overrides row 3"]
+    with engine.connect() as conn:
+        assert conn.execute(select(Company.name).where(Company.company_id == 2)).scalar() == "New name"
+    again = run(engine, book)
+    assert written(again) == 0
+    assert again[2].unchanged == 3
+
+
+def test_unknown_parent_is_skipped_and_linked_once_it_exists(engine):
+    categories = [("C0002", "Chips", "C0001"), ("C0001", "Food", None), ("C0003", "Orphan", "C0099")]
+    first = run(engine, workbook(categories=categories))
+    assert first[0].skipped == ["Categories C0003: unknown parent category 99, imported without a parent"]
+    with engine.connect() as conn:
+        parents = dict(conn.execute(select(Category.category_id, Category.parent_id)).all())
+    assert parents == {1: None, 2: 1, 3: None}
+    run(engine, workbook(categories=categories + [("C0099", "Snacks", None)]))
+    with engine.connect() as conn:
+        assert conn.execute(select(Category.parent_id).where(Category.category_id == 3)).scalar() == 99
+
+
+@pytest.mark.skipif(not os.path.exists(DEFAULT_WORKBOOK), reason="Question Bank workbook not in the tree")
+def test_question_bank_reimport_writes_nothing(engine):
+    openpyxl = pytest.importorskip("openpyxl")
+    book = openpyxl.load_workbook(DEFAULT_WORKBOOK, read_only=True, data_only=True)
+    try:
+        assert written(run(engine, book)) > 0
+        assert written(run(engine, book)) == 0
+    finally:
+        book.close()
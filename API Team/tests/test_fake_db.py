@@ -0,0 +1,116 @@
+# In-memory user store: lookups, snapshots and a writer that outlives a failed dump
+
+import os, time
+
+import pytest
+
+import fake_db
+from fake_db import DuplicateUser, SnapshotWriter, UserStore
+
+
+def add(store, name, pincode, email, mobile):
+    return store.insert(name=name, email=email, age_range="26-30", pincode=pincode, gender="female",
+                        employment_status="employed", mobile_number=mobile)
+
+
+def fill(store):
+    add(store, "Asha", 400001, "asha@example.com", 9000000001)
+    # a family sharing an inbox and a phone
+    add(store, "Ravi", 400002, "home@example.com", 9000000002)
+    add(store, "Meera", 400002, " Home@Example.com", 9000000002)
+    add(store, "Kiran", 400003, "home@example.com", 9000000002)
+
+
+def names(records):
+    return sorted(record.name for record in records)
+
+
+def test_lookups_allow_shared_email_and_mobile():
+    store = UserStore()
+    fill(store)
+    assert store.find("Ravi", 400002).email == "home@example.com"
+    assert store.find("Ravi", 400001) is None
+    assert names(store.find_by_email("asha@example.com")) == ["Asha"]
+    assert names(store.find_by_email("HOME@example.com ")) == ["Kiran", "Meera", "Ravi"]
+    assert names(store.find_by_mobile(9000000002)) == ["Kiran", "Meera", "Ravi"]
+    assert store.find_by_mobile(9000000009) == []
+    # (name, pincode) is still the one unique key
+    with pytest.raises(DuplicateUser):
+        add(store, "Asha", 400001, "other@example.com", 9000000005)
+    assert len(store) == 4
+
+
+def test_snapshot_round_trip(tmp_path):
+    path = str(tmp_path / "users.snapshot")
+    store = UserStore()
+    fill(store)
+    store.snapshot(path)
+    assert not store.dirty
+
+    loaded = UserStore.load(path)
+    assert len(loaded) == 4 and not loaded.dirty
+    assert [record.to_dict() for record in loaded._records] == [record.to_dict() for record in store._records]
+    assert names(loaded.find_by_email("home@example.com")) == ["Kiran", "Meera", "Ravi"]
+    assert names(loaded.find_by_mobile(9000000001)) == ["Asha"]
+    with pytest.raises(DuplicateUser):
+        add(loaded, "Meera", 400002, "meera@example.com", 9000000007)
+    # a missing snapshot is a fresh start
+    assert len(UserStore.load(str(tmp_path / "missing.snapshot"))) == 0
+
+
+def test_snapshot_rejects_another_layout(tmp_path, monkeypatch):
+    path = str(tmp_path / "users.snapshot")
+    store = UserStore()
+    fill(store)
+    store.snapshot(path)
+    monkeypatch.setattr(fake_db, "SNAPSHOT_VERSION", fake_db.SNAPSHOT_VERSION + 1)
+    with pytest.raises(ValueError):
+        UserStore.load(path)
+
+
+def test_writer_survives_a_failed_dump(tmp_path, monkeypatch):
+    path = str(tmp_path / "users.snapshot")
+    store = UserStore()
+    add(store, "Asha", 400001, "asha@example.com", 9000000001)
+    store.snapshot(path)
+
+    failures = []
+    fsync = os.fsync
+
+    def full_disk(fd):
+        if not failures:
+            failures.append(fd)
+            raise OSError(28, "No space left on device")
+        fsync(fd)
+
+    monkeypatch.setattr(fake_db.os, "fsync", full_disk)
+    writer = SnapshotWriter(store, path, interval=0.01)
+    writer.start()
+    add(store, "Ravi", 400002, "ravi@example.com", 9000000002)
+    deadline = time.monotonic() + 5
+    while (not failures or store.dirty) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert writer._thread.is_alive()
+    add(store, "Meera", 400003, "meera@example.com", 9000000003)
+    writer.stop()
+
+    assert failures
+    assert not store.dirty
+    assert names(UserStore.load(path)._records) == ["Asha", "Meera", "Ravi"]
+
+
+def test_failed_dump_keeps_the_previous_snapshot(tmp_path, monkeypatch):
+    path = str(tmp_path / "users.snapshot")
+    store = UserStore()
+    add(store, "Asha", 400001, "asha@example.com", 9000000001)
+    store.snapshot(path)
+    add(store, "Ravi", 400002, "ravi@example.com", 9000000002)
+
+    def full_disk(fd):
+        raise OSError(28, "No space left on device")
+
+    monkeypatch.setattr(fake_db.os, "fsync", full_disk)
+    with pytest.raises(OSError):
+        store.snapshot(path)
+    assert store.dirty
+    assert names(UserStore.load(path)._records) == ["Asha"]
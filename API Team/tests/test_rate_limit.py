@@ -0,0 +1,111 @@
+# Token buckets on the local backend, driven by a fake clock instead of sleeping
+
+import pytest
+
+from rate_limit import LocalBuckets, RateLimited, RateLimiter, Rule
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds: float):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+@pytest.fixture
+def limiter(clock):
+    rules = {name: Rule.parse(name, spec) for name, spec in
+             {"login:ip": "4/60", "login:email": "2/60"}.items()}
+    return RateLimiter(LocalBuckets(clock=clock), rules)
+
+
+def test_burst_up_to_capacity_then_reject(clock):
+    buckets, rule = LocalBuckets(clock=clock), Rule.parse("login:ip", "5/10")
+    assert [buckets.take("a", rule) for _ in range(5)] == [0.0] * 5
+    assert buckets.take("a", rule) == pytest.approx(2.0)  # one token every 2s
+
+
+def test_refill_is_proportional_and_capped(clock):
+    buckets, rule = LocalBuckets(clock=clock), Rule.parse("login:ip", "5/10")
+    for _ in range(5):
+        buckets.take("a", rule)
+    clock.advance(4)  # two tokens back
+    assert buckets.take("a", rule) == 0.0
+    assert buckets.take("a", rule) == 0.0
+    assert buckets.take("a", rule) > 0
+    clock.advance(3600)  # an idle hour refills to capacity, not beyond
+    assert [buckets.take("a", rule) for _ in range(5)] == [0.0] * 5
+    assert buckets.take("a", rule) > 0
+
+
+def test_keys_have_separate_buckets(clock):
+    buckets, rule = LocalBuckets(clock=clock), Rule.parse("login:ip", "1/60")
+    assert buckets.take("a", rule) == 0.0
+    assert buckets.take("b", rule) == 0.0
+    assert buckets.take("a", rule) > 0
+
+
+def test_rejected_email_does_not_spend_the_ip_bucket(limiter):
+    for _ in range(2):
+        limiter.check("login", ip="10.0.0.1", email="a@example.com")
+    for _ in range(5):
+        with pytest.raises(RateLimited) as exc:
+            limiter.check("login", ip="10.0.0.1", email="a@example.com")
+        assert exc.value.rule == "login:email"
+    # the IP spent 2 of its 4 tokens, the rejected attempts took none
+    limiter.check("login", ip="10.0.0.1", email="b@example.com")
+    limiter.check("login", ip="10.0.0.1", email="c@example.com")
+    with pytest.raises(RateLimited) as exc:
+        limiter.check("login", ip="10.0.0.1", email="d@example.com")
+    assert exc.value.rule == "login:ip"
+    assert limiter.rejected == {"login:ip": 1, "login:email": 5}
+
+
+def test_rejected_ip_does_not_spend_the_email_bucket(limiter):
+    for n in range(4):
+        limiter.check("login", ip="10.0.0.1", email=f"user{n}@example.com")
+    with pytest.raises(RateLimited):
+        limiter.check("login", ip="10.0.0.1", email="a@example.com")
+    # a@example.com still has both of its tokens from another address
+    limiter.check("login", ip="10.0.0.2", email="a@example.com")
+    limiter.check("login", ip="10.0.0.2", email="a@example.com")
+
+
+def test_retry_after_is_the_slowest_bucket(limiter, clock):
+    for _ in range(2):
+        limiter.check("login", ip="10.0.0.1", email="a@example.com")
+    for n in range(2):
+        limiter.check("login", ip="10.0.0.1", email=f"other{n}@example.com")
+    with pytest.raises(RateLimited) as exc:
+        limiter.check("login", ip="10.0.0.1", email="a@example.com")
+    # both are empty: the email refills one token in 30s, the IP in 15s
+    assert exc.value.rule == "login:email"
+    assert exc.value.retry_after == pytest.approx(30.0)
+    assert limiter.rejected == {"login:ip": 1, "login:email": 1}
+    clock.advance(30)
+    limiter.check("login", ip="10.0.0.1", email="a@example.com")
+
+
+def test_missing_values_and_rules_are_skipped(limiter):
+    for _ in range(10):
+        limiter.check("login", ip=None, email="")
+        limiter.check("register", ip="10.0.0.1", email="a@example.com")
+
+
+def test_refilled_buckets_are_evicted(clock):
+    buckets, rule = LocalBuckets(clock=clock, evict_interval=60), Rule.parse("login:ip", "2/10")
+    buckets.take("a", rule)
+    buckets.take("b", rule)
+    assert len(buckets) == 2
+    clock.advance(61)
+    buckets.take("c", rule)
+    assert len(buckets) == 1
@@ -0,0 +1,154 @@
+# Write-behind buffer: poison rows, crash recovery and concurrent writers
+
+import asyncio, glob, json, os, threading
+from datetime import datetime
+
+import response_buffer
+from response_buffer import WriteBehindBuffer
+
+
+class Sink:
+    # stands in for the database: rows with "bad" fail the whole batch they are in
+    def __init__(self):
+        self.rows = []
+        self.calls = 0
+
+    def __call__(self, rows):
+        self.calls += 1
+        if any(row.get("bad") for row in rows):
+            raise ValueError("foreign key violation")
+        self.rows.extend(rows)
+
+
+def make_buffer(sink, spill_dir, **options):
+    # the background loop never fires on its own, tests flush explicitly
+    return WriteBehindBuffer(sink, str(spill_dir), batch_size=10000, flush_interval=3600, fsync=False, **options)
+
+
+def segments(spill_dir):
+    return sorted(glob.glob(os.path.join(str(spill_dir), "responses-*.jsonl")))
+
+
+def test_flush_failure_isolates_the_bad_row(tmp_path):
+    sink = Sink()
+    buffer = make_buffer(sink, tmp_path, max_attempts=3)
+    rows = [{"response_id": n, "bad": n == 5} for n in range(8)]
+
+    async def run():
+        await buffer.start()
+        buffer.put_many(rows)
+        await buffer.flush()
+        # everything but the poison row is committed by the first flush
+        assert sorted(row["response_id"] for row in sink.rows) == [0, 1, 2, 3, 4, 6, 7]
+        assert buffer.depth == 1 and buffer.rows_dead_lettered == 0
+        await buffer.flush()
+        await buffer.flush()
+        await buffer.stop()
+
+    asyncio.run(run())
+    assert buffer.depth == 0
+    assert buffer.rows_flushed == 7
+    assert buffer.rows_dead_lettered == 1
+    with open(tmp_path / response_buffer.DEAD_LETTER_FILE) as f:
+        dead = [json.loads(line) for line in f]
+    assert [entry["row"]["response_id"] for entry in dead] == [5]
+    assert dead[0]["attempts"] == 3 and "foreign key violation" in dead[0]["error"]
+    # nothing is owed any more, so no segment is left to replay
+    assert segments(tmp_path) == []
+
+
+def test_outage_keeps_the_batch_whole(tmp_path):
+    down = True
+
+    def flush(rows):
+        if down:
+            raise ConnectionError("database is down")
+        sink(rows)
+
+    sink = Sink()
+    buffer = make_buffer(flush, tmp_path)
+
+    async def run():
+        nonlocal down
+        await buffer.start()
+        buffer.put_many([{"response_id": n} for n in range(4)])
+        for _ in range(5):
+            try:
+                await buffer.flush()
+            except ConnectionError:
+                pass
+        assert buffer.depth == 4 and buffer.rows_dead_lettered == 0
+        down = False
+        await buffer.stop()
+
+    asyncio.run(run())
+    assert [row["response_id"] for row in sink.rows] == [0, 1, 2, 3]
+    assert not os.path.exists(tmp_path / response_buffer.DEAD_LETTER_FILE)
+
+
+def test_leftover_segments_are_replayed_on_start(tmp_path):
+    created = datetime(2024, 5, 1, 10, 30)
+    with open(tmp_path / "responses-1-999-1.jsonl", "w") as f:
+        for n in range(3):
+            f.write(json.dumps({"response_id": n, "created_at": created.isoformat()}) + "\n")
+        # the request being written when the process died was never acknowledged
+        f.write('{"response_id": 3, "created_')
+
+    sink = Sink()
+    buffer = make_buffer(sink, tmp_path)
+
+    async def run():
+        await buffer.start()
+        await buffer.stop()
+
+    asyncio.run(run())
+    assert [row["response_id"] for row in sink.rows] == [0, 1, 2]
+    assert all(row["created_at"] == created for row in sink.rows)
+    assert segments(tmp_path) == []
+
+
+def test_live_segments_are_not_replayed_by_another_worker(tmp_path):
+    first_sink, second_sink = Sink(), Sink()
+    first, second = make_buffer(first_sink, tmp_path), make_buffer(second_sink, tmp_path)
+
+    async def run():
+        await first.start()
+        first.put_many([{"response_id": 1}])
+        await second.start()
+        await second.stop()
+        await first.stop()
+
+    asyncio.run(run())
+    assert second_sink.calls == 0
+    assert [row["response_id"] for row in first_sink.rows] == [1]
+
+
+def test_concurrent_writers_do_not_interleave(tmp_path):
+    writers, batches, batch_rows = 8, 25, 4
+    buffer = make_buffer(Sink(), tmp_path)
+
+    def write(writer):
+        for batch in range(batches):
+            buffer.put_many([{"writer": writer, "batch": batch, "row": n, "pad": "x" * 4096}
+                             for n in range(batch_rows)])
+
+    async def run():
+        await buffer.start()
+        threads = [threading.Thread(target=write, args=(w,)) for w in range(writers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        with open(buffer._segment_path) as f:
+            lines = [json.loads(line) for line in f]
+        await buffer.stop()
+        return lines
+
+    lines = asyncio.run(run())
+    assert len(lines) == writers * batches * batch_rows
+    # every put_many lands as one contiguous run of whole lines
+    for start in range(0, len(lines), batch_rows):
+        chunk = lines[start:start + batch_rows]
+        assert {(row["writer"], row["batch"]) for row in chunk} == {(chunk[0]["writer"], chunk[0]["batch"])}
+        assert [row["row"] for row in chunk] == list(range(batch_rows))
+    assert buffer.rows_flushed == len(lines)
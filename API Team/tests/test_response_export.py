@@ -0,0 +1,57 @@
+# Export watermarks: the safety lag and what may advance a watermark
+
+from datetime import datetime, timedelta, UTC
+
+import pytest
+
+pytest.importorskip("sqlalchemy")
+from sqlalchemy import create_engine
+
+import response_export
+from models import Base, Category, Question, Response, User
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'export.db'}")
+    Base.metadata.create_all(engine)
+    now = datetime.now(UTC)
+    with engine.begin() as conn:
+        conn.execute(User.__table__.insert(), [{"user_id": 1, "full_name": "U", "email": "u@example.com",
+                                                "hashed_password": "-", "gender": "other", "age": "26-30",
+                                                "created_at": now}])
+        conn.execute(Category.__table__.insert(), [{"category_id": 1, "name": "Food", "is_active": True}])
+        conn.execute(Question.__table__.insert(), [{"question_id": 1, "question_description": "How was it?"}])
+        conn.execute(Response.__table__.insert(), [
+            {"response_id": n, "user_id": 1, "category_id": 1, "question_id": 1, "answer_text": "yes",
+             "created_at": now - timedelta(seconds=age)}
+            for n, age in ((1, 600), (2, 300), (3, 5), (4, 1))])
+    yield engine
+    engine.dispose()
+
+
+def test_until_id_leaves_rows_younger_than_the_lag(engine):
+    with engine.connect() as conn:
+        assert response_export.safe_until_id(conn, timedelta(seconds=60)) == 2
+        assert response_export.safe_until_id(conn, timedelta(seconds=3)) == 3
+        assert response_export.safe_until_id(conn, timedelta(0)) == 4
+        assert response_export.safe_until_id(conn, timedelta(hours=1)) == 0
+
+
+def test_time_filter_cannot_move_the_watermark(tmp_path):
+    with pytest.raises(SystemExit):
+        response_export.main(["--output", str(tmp_path / "out.csv"), "--watermark-file", str(tmp_path / "w.json"),
+                              "--since", "2026-10-01", "--database-url", f"sqlite:///{tmp_path / 'none.db'}"])
+    assert not (tmp_path / "w.json").exists()
+
+
+def test_watermark_advances_to_the_safe_until_id(engine, tmp_path):
+    watermark = tmp_path / "w.json"
+    url = str(engine.url)
+    response_export.main(["--output", str(tmp_path / "a.csv"), "--watermark-file", str(watermark),
+                          "--database-url", url])
+    assert response_export.read_watermark(str(watermark)) == 2
+    response_export.main(["--output", str(tmp_path / "b.csv"), "--watermark-file", str(watermark),
+                          "--safety-lag", "0", "--database-url", url])
+    assert response_export.read_watermark(str(watermark)) == 4
+    assert (tmp_path / "b.csv").read_text().count("\n") == 3  # header and responses 3 and 4
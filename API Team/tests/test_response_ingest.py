@@ -0,0 +1,79 @@
+# Answer validation against the catalog index, and the chunked bulk insert
+
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("sqlalchemy")
+from sqlalchemy import create_engine, event, func, select
+from sqlalchemy.orm import Session
+
+import response_ingest
+from models import Base, Response
+from response_ingest import AnswerIndex, bulk_insert, validate_answers
+
+# question 1 is asked in categories 10 and 20, question 2 only in 20; product 100 is sold in 10, 200 in 20
+INDEX = AnswerIndex({(1, 10), (1, 20), (2, 20)}, {100: 10, 200: 20})
+
+
+def answer(question_id, category_id, product_id=None, text="yes"):
+    return SimpleNamespace(question_id=question_id, category_id=category_id, product_id=product_id,
+                           answer_text=text)
+
+
+def reasons(results):
+    return [result.get("reason", result["status"]) for result in results]
+
+
+def test_rejection_reasons():
+    rows, results = validate_answers(INDEX, 7, [
+        answer(1, 10, 100),
+        answer(2, 10),            # question 2 isn't asked in category 10
+        answer(3, 20),            # no such question
+        answer(1, 10, 200),       # product 200 is sold in category 20
+        answer(1, 20, 999),       # unknown product
+        answer(2, 20, text="  "),
+    ])
+    assert reasons(results) == ["accepted", response_ingest.REJECT_QUESTION, response_ingest.REJECT_QUESTION,
+                                response_ingest.REJECT_PRODUCT, response_ingest.REJECT_PRODUCT,
+                                response_ingest.REJECT_EMPTY]
+    assert [result["index"] for result in results] == list(range(6))
+    assert rows == [{"user_id": 7, "question_id": 1, "category_id": 10, "product_id": 100, "answer_text": "yes"}]
+
+
+def test_duplicate_answers_keep_the_first():
+    rows, results = validate_answers(INDEX, 7, [
+        answer(1, 20, text=""),   # rejected as empty, so the next one is not a duplicate of it
+        answer(1, 20, text="first"),
+        answer(1, 20, 200),       # same question, but about a product
+        answer(1, 20, text="second"),
+        answer(1, 10),            # same question in another category
+        answer(1, 20, 200, text="again"),
+    ])
+    assert reasons(results) == [response_ingest.REJECT_EMPTY, "accepted", "accepted",
+                                response_ingest.REJECT_DUPLICATE, "accepted", response_ingest.REJECT_DUPLICATE]
+    assert [row["answer_text"] for row in rows] == ["first", "yes", "yes"]
+
+
+def test_bulk_insert_in_chunks(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'ingest.db'}")
+    Base.metadata.create_all(engine)
+    inserts = []
+
+    @event.listens_for(engine, "before_execute")
+    def count(conn, clauseelement, multiparams, params, execution_options):
+        if clauseelement.is_insert:
+            inserts.append(len(multiparams) or 1)
+
+    rows = [{"user_id": 1, "question_id": 1, "category_id": 10, "product_id": None, "answer_text": str(n)}
+            for n in range(12)]
+    with Session(engine) as db:
+        assert bulk_insert(db, Response.__table__, rows, chunk_size=5) == 12
+        db.commit()
+        stored = db.execute(select(Response.answer_text).order_by(Response.response_id)).scalars().all()
+        assert bulk_insert(db, Response.__table__, []) == 0
+        assert db.execute(select(func.count()).select_from(Response)).scalar() == 12
+    engine.dispose()
+
+    assert inserts == [5, 5, 2]
+    assert stored == [str(n) for n in range(12)]
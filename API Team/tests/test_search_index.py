@@ -0,0 +1,69 @@
+# Memory search: refreshes that find nothing, and a background loop that outlives a failure
+
+import asyncio
+from datetime import datetime
+
+import pytest
+
+pytest.importorskip("sqlalchemy")
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import search_index
+from models import Base, Category, Company, Product
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'search.db'}")
+    Base.metadata.create_all(engine)
+    stamp = datetime(2024, 1, 1, 12, 0)
+    with engine.begin() as conn:
+        conn.execute(Category.__table__.insert(), [{"category_id": 1, "name": "Snacks", "is_active": True}])
+        conn.execute(Company.__table__.insert(), [{"company_id": 1, "name": "PepsiCo", "sector": "FMCG",
+                                                   "parent_category": 1, "updated_at": stamp}])
+        conn.execute(Product.__table__.insert(), [{"product_id": 1, "name": "Lay's Classic", "company_id": 1,
+                                                   "updated_at": stamp}])
+    yield sessionmaker(bind=engine)
+    engine.dispose()
+
+
+def test_idle_refresh_keeps_changed_through(session_factory):
+    search = search_index.MemorySearch(session_factory)
+    search.rebuild()
+    built = search.index.changed_through
+    assert built == datetime(2024, 1, 1, 12, 0)
+    # the newest rows are gone, so no refresh finds anything
+    with session_factory() as db:
+        db.query(Product).delete()
+        db.query(Company).delete()
+        db.commit()
+    for _ in range(3):
+        search.refresh()
+    # the window doesn't creep back REFRESH_OVERLAP per tick
+    assert search.index.changed_through == built
+
+
+def test_loop_survives_a_failed_build(session_factory):
+    calls = []
+
+    def flaky():
+        calls.append(1)
+        if len(calls) == 1:
+            raise RuntimeError("database is down")
+        return session_factory()
+
+    search = search_index.MemorySearch(flaky, refresh_interval=0)
+
+    async def run():
+        await search.start()
+        for _ in range(50):
+            if search.index.ready:
+                break
+            await asyncio.sleep(0.01)
+        await search.stop()
+
+    asyncio.run(run())
+    assert len(calls) >= 2
+    assert search.index.ready
+    assert [hit["type"] for hit in search.search("pepsi")] == ["company"]
@@ -1,9 +1,13 @@
 from fastapi import FastAPI, HTTPException
-from fake_db import fake_user_db
+from fake_db import fake_user_db, DuplicateUser, SnapshotWriter, USER_SNAPSHOT_PATH
 from pydantic import BaseModel, Field
 from typing import Literal
+import os
 
 app = FastAPI()
+# with USER_SNAPSHOT_PATH set, users are reloaded at import and written back every USER_SNAPSHOT_INTERVAL seconds
+snapshots = SnapshotWriter(fake_user_db, USER_SNAPSHOT_PATH, float(os.getenv("USER_SNAPSHOT_INTERVAL", "60"))) \
+    if USER_SNAPSHOT_PATH else None
 
 class UserCreate(BaseModel):
     name: str
@@ -16,12 +20,19 @@ class UserCreate(BaseModel):
 
 @app.post("/create-user")
 def create_user(user: UserCreate):
-    # Optional: Check for duplicates
-    for existing_user in fake_user_db:
-        if existing_user["name"] == user.name and existing_user["pincode"] == user.pincode:
-            raise HTTPException(status_code=400, detail="User already exists")
-    
-    # Add user to fake db
-    user_data = user.dict()
-    fake_user_db.append(user_data)
-    return {"message": "User created successfully", "user": user_data}
+    # the duplicate check is an index lookup on (name, pincode)
+    try:
+        record = fake_user_db.insert(**user.model_dump())
+    except DuplicateUser:
+        raise HTTPException(status_code=400, detail="User already exists")
+    return {"message": "User created successfully", "user": record.to_dict()}
+
+@app.on_event("startup")
+def start_snapshots():
+    if snapshots:
+        snapshots.start()
+
+@app.on_event("shutdown")
+def stop_snapshots():
+    if snapshots:
+        snapshots.stop()
@@ -0,0 +1,94 @@
+# 👤 Stateless auth helpers
+#
+# Access tokens carry the user fields the handlers need, so an authenticated
+# request is served from the signed claims alone. The only thing that can go
+# stale is whether the user is still active and which token version is current;
+# that is kept in a small TTL cache here and invalidated explicitly when a user
+# is deactivated or their tokens are revoked.
+
+import threading, time
+from typing import Dict, Optional, Tuple
+
+UserState = Tuple[bool, int]  # (is_active, token_version)
+
+
+class TokenUser:
+    __slots__ = ("user_id", "full_name", "email", "gender", "age", "income_bracket",
+                 "location", "is_active", "token_version")
+
+    def __init__(self, **fields):
+        for name in self.__slots__:
+            setattr(self, name, fields.get(name))
+
+    @classmethod
+    def from_claims(cls, payload: dict) -> "TokenUser":
+        return cls(
+            user_id=int(payload["sub"]),
+            full_name=payload.get("name"),
+            email=payload.get("email"),
+            gender=payload.get("gender"),
+            age=payload.get("age"),
+            income_bracket=payload.get("inc"),
+            location=payload.get("loc"),
+            is_active=payload.get("act", True),
+            token_version=payload.get("ver", 0),
+        )
+
+
+def user_claims(user) -> dict:
+    return {
+        "sub": str(user.user_id),
+        "name": user.full_name,
+        "email": user.email,
+        "gender": user.gender,
+        "age": user.age,
+        "inc": user.income_bracket,
+        "loc": user.location,
+        "act": bool(user.is_active),
+        "ver": user.token_version or 0,
+    }
+
+
+class UserStateCache:
+    def __init__(self, ttl: float = 60, max_size: int = 100000):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._data: Dict[int, Tuple[UserState, float]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, user_id: int) -> Optional[UserState]:
+        entry = self._data.get(user_id)
+        if entry is None:
+            return None
+        state, expires_at = entry
+        if expires_at < time.monotonic():
+            with self._lock:
+                self._data.pop(user_id, None)
+            return None
+        return state
+
+    def set(self, user_id: int, state: UserState):
+        now = time.monotonic()
+        with self._lock:
+            if len(self._data) >= self.max_size:
+                self._evict(now)
+            self._data[user_id] = (state, now + self.ttl)
+
+    def _evict(self, now: float):
+        expired = [key for key, (_, expires_at) in self._data.items() if expires_at < now]
+        for key in expired:
+            del self._data[key]
+        # still full: drop the oldest inserts (dicts keep insertion order)
+        overflow = len(self._data) - self.max_size + 1
+        for key in list(self._data)[:max(overflow, 0)]:
+            del self._data[key]
+
+    def invalidate(self, user_id: int = None):
+        with self._lock:
+            if user_id is None:
+                self._data.clear()
+            else:
+                self._data.pop(user_id, None)
+
+    def __len__(self):
+        return len(self._data)